@@ -0,0 +1,96 @@
+"""
+模板匹配基准：全分辨率逐尺度搜索（exhaustive）与粗到精搜索（coarse）的耗时与命中对比。
+
+在合成的整屏截图（默认 3840x2160）上按不同缩放比例放置模板，分别用两种方式搜索，
+输出每种情形的耗时（取多次运行的中位数）、加速比，以及两种方式命中位置/得分是否一致。
+
+用法（在项目根目录）：
+    python benchmarks/template_match.py [--width 3840] [--height 2160] [--repeat 5]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from smart.template_detector import DEFAULT_SCALES, build_pyramid, _match_levels  # noqa: E402
+
+
+def make_screen(width: int, height: int, rng: np.random.Generator) -> np.ndarray:
+    """合成类似桌面的截图：纯色面板、文字、少量噪声"""
+    img = np.full((height, width, 3), 235, dtype=np.uint8)
+    for _ in range(300):
+        x, y = int(rng.integers(0, width - 50)), int(rng.integers(0, height - 30))
+        w, h = int(rng.integers(40, 400)), int(rng.integers(20, 200))
+        color = tuple(int(c) for c in rng.integers(0, 255, 3))
+        cv2.rectangle(img, (x, y), (x + w, y + h), color, -1)
+    for _ in range(400):
+        x, y = int(rng.integers(0, width - 200)), int(rng.integers(20, height))
+        cv2.putText(img, "Label %d" % rng.integers(0, 10000), (x, y), cv2.FONT_HERSHEY_SIMPLEX,
+                    float(rng.uniform(0.4, 1.2)), (20, 20, 20), 1, cv2.LINE_AA)
+    noise = rng.integers(0, 6, img.shape, dtype=np.uint8)
+    return cv2.add(img, noise)
+
+
+def make_template() -> np.ndarray:
+    """一个带文字的绿色按钮"""
+    tpl = np.full((48, 160, 3), 255, dtype=np.uint8)
+    cv2.rectangle(tpl, (2, 2), (157, 45), (60, 180, 75), -1)
+    cv2.putText(tpl, "Next >", (22, 33), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (255, 255, 255), 2, cv2.LINE_AA)
+    return tpl
+
+
+def timed(fn, repeat: int):
+    times, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--width", type=int, default=3840)
+    parser.add_argument("--height", type=int, default=2160)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    tpl = make_template()
+    levels = build_pyramid(tpl, DEFAULT_SCALES)
+
+    print(f"截图 {args.width}x{args.height}，模板 {tpl.shape[1]}x{tpl.shape[0]}，尺度 {DEFAULT_SCALES}")
+    print(f"{'放置比例':>8} {'全搜索(ms)':>12} {'粗到精(ms)':>12} {'加速':>7}  一致")
+    total_ex = total_cf = 0.0
+    agree_all = True
+    for placed_scale in (0.9, 1.0, 1.1):
+        screen = make_screen(args.width, args.height, rng)
+        h, w = tpl.shape[:2]
+        pw, ph = int(w * placed_scale), int(h * placed_scale)
+        px, py = int(rng.integers(0, args.width - pw)), int(rng.integers(0, args.height - ph))
+        screen[py:py + ph, px:px + pw] = cv2.resize(tpl, (pw, ph), interpolation=cv2.INTER_AREA)
+
+        t_ex, (v_ex, loc_ex, wh_ex) = timed(lambda: _match_levels(levels, screen, search="exhaustive"), args.repeat)
+        t_cf, (v_cf, loc_cf, wh_cf) = timed(lambda: _match_levels(levels, screen, search="coarse"), args.repeat)
+        same = (loc_ex is not None and loc_cf is not None
+                and abs(loc_ex[0] - loc_cf[0]) <= 2 and abs(loc_ex[1] - loc_cf[1]) <= 2
+                and wh_ex == wh_cf and abs(v_ex - v_cf) < 0.02)
+        agree_all &= same
+        total_ex += t_ex
+        total_cf += t_cf
+        print(f"{placed_scale:>8.2f} {t_ex * 1e3:>12.1f} {t_cf * 1e3:>12.1f} {t_ex / t_cf:>6.1f}x  "
+              f"{'是' if same else '否'}  全搜索 {loc_ex}@{v_ex:.3f} / 粗到精 {loc_cf}@{v_cf:.3f}（实际 {(px, py)}）")
+
+    print(f"合计: 全搜索 {total_ex * 1e3:.1f} ms，粗到精 {total_cf * 1e3:.1f} ms，"
+          f"加速 {total_ex / total_cf:.1f}x，命中{'全部一致' if agree_all else '存在差异'}")
+
+
+if __name__ == "__main__":
+    main()
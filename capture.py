@@ -0,0 +1,116 @@
+import threading
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+
+class CaptureRing:
+    """
+    单生产者/单消费者环形缓冲（预分配槽位，无锁）。
+    生产者为某个 pynput 监听线程，只做一次槽位写入和一次下标递增；
+    消费者为排空线程。缓冲满时丢弃新事件并计数。
+    同时记录生产者回调的耗时（纳秒），用于观察录制是否拖慢系统输入。
+    """
+
+    __slots__ = ("capacity", "_mask", "_slots", "_write", "_read",
+                 "dropped", "callbacks", "callback_total_ns", "callback_max_ns")
+
+    def __init__(self, capacity: int = 1 << 16):
+        size = 1
+        while size < capacity:
+            size <<= 1
+        self.capacity = size
+        self._mask = size - 1
+        self._slots: List[Any] = [None] * size
+        self._write = 0
+        self._read = 0
+        self.dropped = 0
+        self.callbacks = 0
+        self.callback_total_ns = 0
+        self.callback_max_ns = 0
+
+    def push(self, item: Any) -> bool:
+        w = self._write
+        if w - self._read >= self.capacity:
+            self.dropped += 1
+            return False
+        self._slots[w & self._mask] = item
+        self._write = w + 1  # 先写槽位再发布下标
+        return True
+
+    def record_latency(self, ns: int) -> None:
+        self.callbacks += 1
+        self.callback_total_ns += ns
+        if ns > self.callback_max_ns:
+            self.callback_max_ns = ns
+
+    def pop_all(self) -> List[Any]:
+        r, w = self._read, self._write
+        if r == w:
+            return []
+        slots, mask = self._slots, self._mask
+        items = [slots[i & mask] for i in range(r, w)]
+        for i in range(r, w):
+            slots[i & mask] = None
+        self._read = w
+        return items
+
+
+class CaptureDrainer:
+    """
+    后台排空线程：周期性取出各环形缓冲中的原始捕获项，按时间排序后转换为事件交给 sink
+    （通常为 EventStore.append，或其前置的抽稀阶段；sink 若有 flush() 会在停止时调用）。
+    原始捕获项为 (t_ns, ...)，由 convert(item, t_seconds) 转换为事件 tuple（返回 None 表示丢弃）。
+    """
+
+    def __init__(self, rings: Sequence[CaptureRing], sink: Callable[[Any], None], start_ns: int,
+                 convert: Callable[[Tuple, float], Any], interval: float = 0.01):
+        self.rings = list(rings)
+        self.sink = sink
+        self.start_ns = start_ns
+        self.convert = convert
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.drain()
+        self.drain()
+
+    def drain(self) -> int:
+        batch: List[Tuple] = []
+        for ring in self.rings:
+            batch.extend(ring.pop_all())
+        if not batch:
+            return 0
+        if len(self.rings) > 1:
+            batch.sort(key=lambda item: item[0])
+        start_ns, convert, append = self.start_ns, self.convert, self.sink
+        for item in batch:
+            ev = convert(item, (item[0] - start_ns) / 1e9)
+            if ev is not None:
+                append(ev)
+        return len(batch)
+
+    def stop(self) -> None:
+        """停止并做最后一次排空"""
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        else:
+            self.drain()
+        flush = getattr(self.sink, "flush", None)
+        if flush is not None:
+            flush()
+
+    def stats(self) -> Dict[str, float]:
+        callbacks = sum(r.callbacks for r in self.rings)
+        total_ns = sum(r.callback_total_ns for r in self.rings)
+        return {
+            "callbacks": callbacks,
+            "dropped": sum(r.dropped for r in self.rings),
+            "mean_callback_us": (total_ns / callbacks / 1e3) if callbacks else 0.0,
+            "max_callback_us": max((r.callback_max_ns for r in self.rings), default=0) / 1e3,
+        }
@@ -0,0 +1,114 @@
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from event_store import EventStore, OP_MOUSE_MOVE, as_store
+
+# 批量精简的默认参数：距离阈值（像素）、时间阈值（秒）、RDP 容差（像素）
+DEFAULT_MIN_DISTANCE = 2.0
+DEFAULT_MIN_INTERVAL = 0.0
+DEFAULT_EPSILON = 1.5
+
+
+class MoveDecimator:
+    """
+    录制时的鼠标移动在线抽稀：与上一个保留的移动相比，距离小于 min_distance（像素）
+    或间隔小于 min_interval（秒）的移动被丢弃（阈值为 0 表示不启用该项）。
+    最近一次被丢弃的移动会暂存：下一个非移动事件（点击、按键等）到来或录制结束时补发，
+    保证点击前的落点与轨迹终点不丢失。
+    """
+
+    def __init__(self, sink: Callable[[Any], None], min_distance: float = 0.0, min_interval: float = 0.0):
+        self.sink = sink
+        self.min_distance_sq = float(min_distance) ** 2
+        self.min_interval = float(min_interval)
+        self._last: Optional[Tuple[float, float, float]] = None
+        self._pending: Any = None
+        self.removed = 0
+
+    def __call__(self, ev: Any) -> None:
+        if ev[0] != "mouse_move":
+            self.flush()
+            self._last = None
+            self.sink(ev)
+            return
+        (x, y), t = ev[1], ev[-1]
+        last = self._last
+        if last is not None:
+            dx, dy = x - last[0], y - last[1]
+            if dx * dx + dy * dy < self.min_distance_sq or t - last[2] < self.min_interval:
+                if self._pending is not None:
+                    self.removed += 1
+                self._pending = ev
+                return
+        if self._pending is not None:
+            self.removed += 1
+            self._pending = None
+        self._last = (x, y, t)
+        self.sink(ev)
+
+    def flush(self) -> None:
+        if self._pending is not None:
+            ev, self._pending = self._pending, None
+            self._last = (ev[1][0], ev[1][1], ev[-1])
+            self.sink(ev)
+
+
+def _rdp_keep(xs: Sequence[int], ys: Sequence[int], lo: int, hi: int, epsilon: float) -> List[bool]:
+    """Ramer–Douglas–Peucker：返回 [lo, hi] 区间内各点是否保留（端点总是保留）"""
+    keep = [False] * (hi - lo + 1)
+    keep[0] = keep[-1] = True
+    eps_sq = epsilon * epsilon
+    stack = [(lo, hi)]
+    while stack:
+        a, b = stack.pop()
+        if b - a < 2:
+            continue
+        ax, ay = xs[a], ys[a]
+        dx, dy = xs[b] - ax, ys[b] - ay
+        seg_sq = dx * dx + dy * dy
+        best, best_d = -1, eps_sq
+        for i in range(a + 1, b):
+            px, py = xs[i] - ax, ys[i] - ay
+            if seg_sq == 0:
+                d = px * px + py * py
+            else:
+                cross = px * dy - py * dx
+                d = cross * cross / seg_sq
+            if d > best_d:
+                best, best_d = i, d
+        if best >= 0:
+            keep[best - lo] = True
+            stack.append((a, best))
+            stack.append((best, b))
+    return keep
+
+
+def compact_events(events: Sequence, min_distance: float = 0.0, min_interval: float = 0.0,
+                   epsilon: float = 0.0) -> Tuple[EventStore, int]:
+    """
+    批量精简鼠标移动：先按距离/时间阈值抽稀，再对每段连续移动做 RDP 简化（epsilon 像素）。
+    每段连续移动的首尾（即点击、按键等事件前后的位置）总是保留。
+    返回 (新的事件存储, 移除的事件数)。
+    """
+    store = as_store(events)
+    out = EventStore()
+    decimator = MoveDecimator(out.append, min_distance, min_interval)
+    ops, xs, ys = store.op, store.x, store.y
+    n = len(store)
+    i = 0
+    while i < n:
+        if ops[i] != OP_MOUSE_MOVE:
+            decimator(store.event(i))
+            i += 1
+            continue
+        j = i
+        while j + 1 < n and ops[j + 1] == OP_MOUSE_MOVE:
+            j += 1
+        keep = _rdp_keep(xs, ys, i, j, epsilon) if epsilon > 0 else None
+        for k in range(i, j + 1):
+            if keep is None or keep[k - i]:
+                decimator(store.event(k))
+        # 段尾总是保留
+        decimator.flush()
+        i = j + 1
+    decimator.flush()
+    return out, n - len(out)
@@ -0,0 +1,226 @@
+from array import array
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, Iterator, List, Sequence
+
+# 事件操作码（录制存储与回放计划共用）
+OP_KEY_PRESS = 0
+OP_KEY_RELEASE = 1
+OP_MOUSE_MOVE = 2
+OP_MOUSE_PRESS = 3
+OP_MOUSE_RELEASE = 4
+OP_MOUSE_SCROLL = 5
+OP_SMART = 6
+OP_IF_GUARD = 7
+OP_END_GUARD = 8
+OP_WHILE = 9
+OP_NOP = 10  # 无法解析的事件：原样保存在旁表中，回放时跳过
+OP_SCREEN_SYNC = 11  # 屏幕就绪同步：等待区域指纹与录制时一致
+
+OP_NAMES = (
+    "key_press", "key_release", "mouse_move", "mouse_press", "mouse_release", "mouse_scroll",
+)
+_NAME_TO_OP = {name: op for op, name in enumerate(OP_NAMES)}
+_CONTROL_OPS = {
+    "smart_if_guard_ocr": OP_IF_GUARD,
+    "smart_end_guard": OP_END_GUARD,
+    "smart_while_ocr": OP_WHILE,
+    "smart_screen_sync": OP_SCREEN_SYNC,
+}
+
+
+class EventStore:
+    """
+    列式事件存储：每个事件占用若干并行类型化数组中的一格，
+      - op: 操作码（B）         - t: 时间戳秒（d）
+      - x/y: 坐标（i）          - a/b: 键/按钮编号、滚动 dx/dy、旁表编号（i）
+    键名与按钮名放在去重表 keys/buttons 中；smart_* 等不定形事件原样放入旁表 payloads。
+    对外保持列表式接口（len/下标/迭代/append），下标访问时按需还原为 JSON 形状的事件。
+    """
+
+    __slots__ = ("op", "t", "x", "y", "a", "b",
+                 "keys", "_key_ids", "buttons", "_button_ids",
+                 "payloads", "payload_pos")
+
+    def __init__(self):
+        self.op = array("B")
+        self.t = array("d")
+        self.x = array("i")
+        self.y = array("i")
+        self.a = array("i")
+        self.b = array("i")
+        self.keys: List[str] = []
+        self._key_ids: Dict[str, int] = {}
+        self.buttons: List[str] = []
+        self._button_ids: Dict[str, int] = {}
+        self.payloads: List[Any] = []
+        self.payload_pos: List[int] = []  # 旁表条目 -> 事件下标（升序）
+
+    @classmethod
+    def from_events(cls, events: Iterable[Any]) -> "EventStore":
+        store = cls()
+        store.extend(events)
+        return store
+
+    @classmethod
+    def from_columns(cls, op: array, t: array, x: array, y: array, a: array, b: array,
+                     keys: List[str], buttons: List[str],
+                     payloads: List[Any], payload_pos: List[int]) -> "EventStore":
+        """直接由列数组与去重表/旁表构造（二进制录制载入时使用）"""
+        store = cls()
+        store.op, store.t, store.x, store.y, store.a, store.b = op, t, x, y, a, b
+        store.keys = list(keys)
+        store._key_ids = {k: i for i, k in enumerate(store.keys)}
+        store.buttons = list(buttons)
+        store._button_ids = {k: i for i, k in enumerate(store.buttons)}
+        store.payloads = list(payloads)
+        store.payload_pos = list(payload_pos)
+        return store
+
+    # —— 写入 ——
+    def _key_id(self, name: str) -> int:
+        kid = self._key_ids.get(name)
+        if kid is None:
+            kid = self._key_ids[name] = len(self.keys)
+            self.keys.append(name)
+        return kid
+
+    def _button_id(self, name: str) -> int:
+        bid = self._button_ids.get(name)
+        if bid is None:
+            bid = self._button_ids[name] = len(self.buttons)
+            self.buttons.append(name)
+        return bid
+
+    def _push(self, op: int, t: float, x: int, y: int, a: int, b: int) -> None:
+        self.op.append(op)
+        self.t.append(t)
+        self.x.append(x)
+        self.y.append(y)
+        self.a.append(a)
+        self.b.append(b)
+
+    def _push_payload(self, op: int, t: float, ev: Any) -> None:
+        self.payload_pos.append(len(self.op))
+        self._push(op, t, 0, 0, len(self.payloads), 0)
+        self.payloads.append(ev)
+
+    def append(self, ev: Any) -> None:
+        """追加一个事件（录制回调产生的 tuple 或 JSON 载入的 list）"""
+        try:
+            t = float(ev[-1])
+        except (TypeError, ValueError, IndexError, KeyError):
+            # 无时间戳：沿用上一事件的时间，保持时间列单调（index_at 依赖二分查找）
+            self._push_payload(OP_NOP, self.t[-1] if len(self.t) else 0.0, ev)
+            return
+
+        et = ev[0]
+        op = _NAME_TO_OP.get(et) if isinstance(et, str) else None
+        n = len(ev)
+        try:
+            if op is not None:
+                if op <= OP_KEY_RELEASE:
+                    if n == 3 and isinstance(ev[1], str):
+                        self._push(op, t, 0, 0, self._key_id(ev[1]), 0)
+                        return
+                elif op == OP_MOUSE_MOVE:
+                    if n == 3:
+                        self._push(op, t, int(ev[1][0]), int(ev[1][1]), 0, 0)
+                        return
+                elif op == OP_MOUSE_SCROLL:
+                    if n == 4:
+                        self._push(op, t, int(ev[2][0]), int(ev[2][1]), int(ev[1][0]), int(ev[1][1]))
+                        return
+                elif n == 4 and isinstance(ev[1], str):
+                    self._push(op, t, int(ev[2][0]), int(ev[2][1]), self._button_id(ev[1]), 0)
+                    return
+        except (TypeError, ValueError, IndexError, OverflowError):
+            pass
+
+        if isinstance(et, str) and et.startswith("smart_"):
+            self._push_payload(_CONTROL_OPS.get(et, OP_SMART), t, list(ev))
+        else:
+            self._push_payload(OP_NOP, t, list(ev) if isinstance(ev, tuple) else ev)
+
+    def extend(self, events: Iterable[Any]) -> None:
+        for ev in events:
+            self.append(ev)
+
+    def clear(self) -> None:
+        self.__init__()
+
+    # —— 读取（列表式接口）——
+    def __len__(self) -> int:
+        return len(self.op)
+
+    def event(self, i: int) -> Any:
+        """第 i 个事件还原为 JSON 形状（list）"""
+        op = self.op[i]
+        if op <= OP_KEY_RELEASE:
+            return [OP_NAMES[op], self.keys[self.a[i]], self.t[i]]
+        if op == OP_MOUSE_MOVE:
+            return ["mouse_move", [self.x[i], self.y[i]], self.t[i]]
+        if op == OP_MOUSE_SCROLL:
+            return ["mouse_scroll", [self.a[i], self.b[i]], [self.x[i], self.y[i]], self.t[i]]
+        if op <= OP_MOUSE_RELEASE:
+            return [OP_NAMES[op], self.buttons[self.a[i]], [self.x[i], self.y[i]], self.t[i]]
+        return self.payloads[self.a[i]]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.event(j) for j in range(*i.indices(len(self.op)))]
+        if i < 0:
+            i += len(self.op)
+        if not 0 <= i < len(self.op):
+            raise IndexError("event index out of range")
+        return self.event(i)
+
+    def __iter__(self) -> Iterator[Any]:
+        for i in range(len(self.op)):
+            yield self.event(i)
+
+    def to_list(self) -> List[Any]:
+        return [self.event(i) for i in range(len(self.op))]
+
+    def index_at(self, t: float) -> int:
+        """时间戳 -> 第一个不早于 t 的事件下标（事件按时间升序）"""
+        return bisect_left(self.t, t)
+
+    @property
+    def nbytes(self) -> int:
+        """列数组占用的字节数（不含旁表与去重表）"""
+        return sum(col.itemsize * len(col) for col in (self.op, self.t, self.x, self.y, self.a, self.b))
+
+
+class MappedEventStore(EventStore):
+    """
+    内存映射的只读事件存储：列为映射文件上的 memoryview，不把文件内容复制为 Python 对象。
+    由 recording_format.map_recording 创建。
+    """
+
+    __slots__ = ("filename", "_mm")
+
+    def append(self, ev: Any) -> None:
+        raise TypeError("内存映射的录制为只读")
+
+    def extend(self, events: Iterable[Any]) -> None:
+        raise TypeError("内存映射的录制为只读")
+
+    @property
+    def nbytes(self) -> int:
+        # 列数据位于操作系统页缓存中，不计入进程内存预算
+        return 0
+
+    def materialize(self) -> EventStore:
+        """复制为普通（可写）事件存储，之后即可释放映射"""
+        return EventStore.from_columns(
+            array("B", self.op), array("d", self.t), array("i", self.x), array("i", self.y),
+            array("i", self.a), array("i", self.b),
+            self.keys, self.buttons, self.payloads, self.payload_pos,
+        )
+
+
+def as_store(events: Sequence) -> EventStore:
+    """任意事件序列 -> EventStore（已是 EventStore 时原样返回）"""
+    if isinstance(events, EventStore):
+        return events
+    return EventStore.from_events(events)
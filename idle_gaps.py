@@ -0,0 +1,80 @@
+from typing import Dict, Sequence
+
+from event_store import (
+    OP_KEY_PRESS, OP_KEY_RELEASE, OP_MOUSE_PRESS, OP_MOUSE_RELEASE, OP_NOP, as_store,
+)
+
+
+class GapLimiter:
+    """
+    空闲间隔压缩：相邻事件（含录制开始到首个事件）的间隔超过 max_gap（秒，录制时间轴）时，
+    超出部分不再等待。
+    idle_only=True 时仅压缩“输入段之间”的间隔：仍有按键或鼠标按钮按下（拖拽、长按、组合键）
+    时保持原间隔，避免改变按住时长。
+    回放循环与分析共用，按事件顺序调用 step()。
+    """
+
+    __slots__ = ("max_gap", "idle_only", "prev_t", "_keys", "_buttons", "capped", "saved")
+
+    def __init__(self, max_gap: float, idle_only: bool = True):
+        self.max_gap = max(float(max_gap), 0.0)
+        self.idle_only = bool(idle_only)
+        self.prev_t = 0.0
+        self._keys = set()
+        self._buttons = set()
+        self.capped = 0
+        self.saved = 0.0
+
+    def reset(self, t: float = 0.0) -> None:
+        """从时间轴 t 重新开始计算间隔（跳转、阻塞事件之后调用）；按住状态保留"""
+        self.prev_t = t
+
+    def cap(self, gap: float) -> float:
+        """按当前按住状态，间隔 gap 实际需要等待的时长（不改变状态）"""
+        if gap > self.max_gap and not (self.idle_only and (self._keys or self._buttons)):
+            return self.max_gap
+        return gap
+
+    def step(self, op: int, t: float, code: int) -> float:
+        """
+        记录一个事件（code 为键/按钮编号），返回该事件前应跳过的时间（秒，录制时间轴）。
+        """
+        gap = t - self.prev_t
+        skip = gap - self.cap(gap)
+        if skip > 0:
+            self.capped += 1
+            self.saved += skip
+        self.prev_t = t
+
+        if op == OP_KEY_PRESS:
+            self._keys.add(code)
+        elif op == OP_KEY_RELEASE:
+            self._keys.discard(code)
+        elif op == OP_MOUSE_PRESS:
+            self._buttons.add(code)
+        elif op == OP_MOUSE_RELEASE:
+            self._buttons.discard(code)
+        return skip
+
+
+def analyze_gaps(events: Sequence, max_gap: float, idle_only: bool = True, speed: float = 1.0) -> Dict[str, float]:
+    """
+    估算空闲间隔压缩可节省的回放时间（秒）。
+    只按时间轴计算，不含智能等待、WHILE 块等运行期才确定的耗时。
+    """
+    store = as_store(events)
+    speed = max(float(speed), 1e-6)
+    limiter = GapLimiter(max_gap, idle_only)
+    ops, times, codes = store.op, store.t, store.a
+    for i in range(len(store)):
+        if ops[i] != OP_NOP:
+            limiter.step(ops[i], times[i], codes[i])
+    duration = (times[len(store) - 1] / speed) if len(store) else 0.0
+    saved = limiter.saved / speed
+    return {
+        "events": len(store),
+        "duration": duration,
+        "compressed_duration": duration - saved,
+        "saved": saved,
+        "gaps_capped": limiter.capped,
+    }
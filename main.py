@@ -1,10 +1,26 @@
+import argparse
 import sys
 from PyQt5.QtWidgets import QApplication
 from main_window import MacroRecorderApp
 from custom_process_integration import install_custom_process_feature
 
+# OCR 引擎（可选）：启动时在后台预热，避免首个智能步骤在回放中途等待模型加载
+try:
+    from smart.ocr_utils import warm_up as warm_up_ocr
+except Exception:
+    warm_up_ocr = None
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="键鼠宏录制与回放")
+    parser.add_argument("--ocr-workers", type=int, default=0,
+                        help="OCR 工作进程数（0 为在回放线程内识别）")
+    # 其余参数（如 Qt 的 -style）交给 QApplication
+    args, rest = parser.parse_known_args()
+    return args, [sys.argv[0]] + rest
+
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
+    args, qt_argv = parse_args()
+    app = QApplication(qt_argv)
     app.setStyle("Fusion")  # 使用Fusion主题
 
     # 设置应用程序样式
@@ -38,8 +54,13 @@ if __name__ == "__main__":
         }
     """)
 
+    # 启用进程池时只由工作进程加载引擎，本进程不再预热（避免模型加载两次）
+    if warm_up_ocr is not None:
+        warm_up_ocr(workers=args.ocr_workers)
+
     try:
         window = MacroRecorderApp()
+        window.recorder.ocr_workers = args.ocr_workers
         # 最小侵入式安装“自定义过程”功能（新增“工具->自定义过程...”菜单项）
         install_custom_process_feature(window)
 
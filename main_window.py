@@ -13,9 +13,13 @@ from PyQt5.QtGui import QIcon, QPixmap, QFont, QPalette, QColor, QBrush, QLinear
 from pynput import keyboard
 
 from recorder import KeyMouseRecorder
+from compaction import DEFAULT_EPSILON, DEFAULT_MIN_DISTANCE, DEFAULT_MIN_INTERVAL
 from models import MacroStep, MacroTask
 from delegates import SpinBoxDelegate
 
+# 新录制默认保存为二进制格式；旧的 .json 录制仍可直接加载
+RECORDING_EXT = ".mrec"
+
 
 class OceanItemDelegate(QStyledItemDelegate):
     """海洋风格的项目委托"""
@@ -593,12 +597,22 @@ class MacroRecorderApp(QMainWindow):
 
         left_layout.addLayout(button_layout)
 
+        # 屏幕就绪同步：录制时在点击前保存区域指纹，回放时画面一致即点击
+        self.screen_sync_check = QCheckBox("录制屏幕同步点（画面就绪即点击）")
+        self.screen_sync_check.toggled.connect(lambda checked: setattr(self.recorder, "screen_sync", checked))
+        left_layout.addWidget(self.screen_sync_check)
+
         # 录制列表
         left_layout.addWidget(OceanLabel("录制列表:"))
         self.recording_list_widget = OceanListWidget()
         self.recording_list_widget.itemDoubleClicked.connect(self.load_selected_recording)
         left_layout.addWidget(self.recording_list_widget, 1)
 
+        # 精简选中录制的鼠标轨迹
+        self.compact_button = OceanButton("精简轨迹")
+        self.compact_button.clicked.connect(self.compact_selected_recording)
+        left_layout.addWidget(self.compact_button)
+
         # 任务列表
         left_layout.addWidget(OceanLabel("任务列表:"))
         self.task_list_widget = OceanListWidget()
@@ -708,6 +722,27 @@ class MacroRecorderApp(QMainWindow):
 
         task_info_layout.addLayout(loop_layout)
 
+        # 空闲间隔压缩
+        gap_layout = QHBoxLayout()
+        gap_layout.setSpacing(10)
+
+        gap_layout.addWidget(OceanLabel("最大空闲间隔 (0=不压缩):"))
+        self.max_gap_spin = OceanDoubleSpinBox()
+        self.max_gap_spin.setDecimals(2)
+        self.max_gap_spin.setRange(0.0, 3600.0)
+        self.max_gap_spin.setSuffix(" 秒")
+        gap_layout.addWidget(self.max_gap_spin, 1)
+
+        self.idle_gaps_only_check = QCheckBox("仅输入段之间")
+        self.idle_gaps_only_check.setChecked(True)
+        gap_layout.addWidget(self.idle_gaps_only_check)
+
+        self.analyze_gaps_btn = OceanButton("分析节省时间")
+        self.analyze_gaps_btn.clicked.connect(self.analyze_task_gaps)
+        gap_layout.addWidget(self.analyze_gaps_btn)
+
+        task_info_layout.addLayout(gap_layout)
+
         right_layout.addWidget(self.task_info_group)
 
         # 任务步骤
@@ -860,7 +895,11 @@ class MacroRecorderApp(QMainWindow):
     def stop_recording(self):
         """停止录制"""
         self.recorder.stop_recording()
-        self.status_label.setText("状态: 录制完成")
+        dropped = self.recorder.capture_stats().get("dropped", 0)
+        if dropped:
+            self.status_label.setText(f"状态: 录制完成（缓冲溢出丢弃 {dropped} 个事件）")
+        else:
+            self.status_label.setText("状态: 录制完成")
         self.status_label.setStyleSheet("""
             QLabel {
                 color: #4caf50;
@@ -939,31 +978,103 @@ class MacroRecorderApp(QMainWindow):
         if not os.path.exists(recordings_dir):
             os.makedirs(recordings_dir)
 
-        file_path = os.path.join(recordings_dir, f"{name}.json")
+        file_path = os.path.join(recordings_dir, f"{name}{RECORDING_EXT}")
         self.recorder.save_recording(file_path)
+        self._retire_legacy_recording(os.path.join(recordings_dir, f"{name}.json"), file_path)
 
-        # 添加到录制列表
+        # 添加到录制列表（同名覆盖时不重复添加）
+        if name not in self.recordings:
+            self.recording_list_widget.addItem(name)
         self.recordings[name] = file_path
-        self.recording_list_widget.addItem(name)
 
         QMessageBox.information(self, "成功", f"录制 '{name}' 已保存")
 
+    def _retire_legacy_recording(self, legacy_path: str, new_path: str):
+        """以新格式保存同名录制后删除旧的 JSON 文件，引用它的任务步骤改指向新文件"""
+        if not os.path.exists(legacy_path):
+            return
+        self.recorder.detach_file(legacy_path)
+        try:
+            os.remove(legacy_path)
+        except OSError:
+            return
+        changed = False
+        for task in self.tasks.values():
+            for step in task.steps:
+                if os.path.abspath(step.file_path) == os.path.abspath(legacy_path):
+                    step.file_path = new_path
+                    changed = True
+        if changed:
+            self.save_tasks_to_file()
+
     def load_recording(self, name: str):
-        """从文件加载录制"""
+        """从文件加载录制（在后台线程解析，避免大录制阻塞界面）"""
         if name in self.recordings:
-            try:
-                self.recorder.load_recording(self.recordings[name])
-                event_count = len(self.recorder.recorded_events)
-                self.info_label.setText(f"录制事件数: {event_count}")
-                QMessageBox.information(self, "成功", f"录制 '{name}' 已加载")
-            except Exception as e:
-                QMessageBox.critical(self, "错误", f"加载失败: {str(e)}")
+            loader_thread = threading.Thread(target=self._load_recording_worker, args=(name,))
+            loader_thread.daemon = True
+            loader_thread.start()
+
+    def _load_recording_worker(self, name: str):
+        """加载录制的线程函数，完成后回到界面线程提示"""
+        try:
+            self.recorder.load_recording(self.recordings[name], lazy=True)
+            QTimer.singleShot(0, lambda: self.on_recording_loaded(name))
+        except Exception as e:
+            error_msg = f"加载失败: {str(e)}"
+            QTimer.singleShot(0, lambda: QMessageBox.critical(self, "错误", error_msg))
+
+    def on_recording_loaded(self, name: str):
+        """录制加载完成后的UI更新"""
+        event_count = len(self.recorder.recorded_events)
+        self.info_label.setText(f"录制事件数: {event_count}")
+        if self.recorder.load_warnings:
+            QMessageBox.warning(self, "警告", f"录制 '{name}' 已加载，但结构有问题:\n" + "\n".join(self.recorder.load_warnings[:10]))
+        else:
+            QMessageBox.information(self, "成功", f"录制 '{name}' 已加载")
 
     def load_selected_recording(self, item):
         """加载选中的录制"""
         name = item.text()
         self.load_recording(name)
 
+    def compact_selected_recording(self):
+        """精简选中录制文件中的鼠标移动（原地覆盖）"""
+        current_item = self.recording_list_widget.currentItem()
+        if not current_item or current_item.text() not in self.recordings:
+            QMessageBox.warning(self, "警告", "请先选择一个录制")
+            return
+        if self.recorder.is_recording or self.recorder.is_playing:
+            QMessageBox.warning(self, "警告", "请先停止录制或回放")
+            return
+        name = current_item.text()
+        # 大录制的 RDP 精简可能耗时数秒：在后台线程执行，完成后回到界面线程提示
+        self.compact_button.setEnabled(False)
+        compact_thread = threading.Thread(target=self._compact_recording_worker, args=(name, self.recordings[name]))
+        compact_thread.daemon = True
+        compact_thread.start()
+
+    def _compact_recording_worker(self, name: str, file_path: str):
+        """精简录制的线程函数"""
+        try:
+            removed = self.recorder.compact_file(
+                file_path,
+                min_distance=DEFAULT_MIN_DISTANCE,
+                min_interval=DEFAULT_MIN_INTERVAL,
+                epsilon=DEFAULT_EPSILON,
+            )
+            QTimer.singleShot(0, lambda: self.on_recording_compacted(name, removed))
+        except Exception as e:
+            error_msg = f"精简录制失败: {str(e)}"
+            QTimer.singleShot(0, lambda: self.on_recording_compacted(name, None, error_msg))
+
+    def on_recording_compacted(self, name: str, removed: Optional[int], error_msg: str = ""):
+        """精简完成后的UI更新"""
+        self.compact_button.setEnabled(True)
+        if removed is None:
+            QMessageBox.critical(self, "错误", error_msg)
+        else:
+            QMessageBox.information(self, "精简完成", f"录制 '{name}' 共移除 {removed} 个冗余移动事件")
+
     def delete_recording(self):
         """删除选中的录制"""
         current_item = self.recording_list_widget.currentItem()
@@ -983,6 +1094,8 @@ class MacroRecorderApp(QMainWindow):
                 # 删除文件
                 if name in self.recordings:
                     try:
+                        # 释放可能存在的内存映射（Windows 下映射中的文件无法删除）
+                        self.recorder.detach_file(self.recordings[name])
                         os.remove(self.recordings[name])
                         del self.recordings[name]
                     except Exception as e:
@@ -1030,7 +1143,16 @@ class MacroRecorderApp(QMainWindow):
         if not self.recorder.is_playing and self.stop_play_button.isEnabled():
             self.play_button.setEnabled(True)
             self.stop_play_button.setEnabled(False)
-            self.status_label.setText("状态: 回放完成")
+            stats = self.recorder.last_playback_stats or {}
+            parts = []
+            if stats.get("events"):
+                parts.append(f"最大延迟 {stats['max_lateness'] * 1000:.1f} ms")
+            memory = stats.get("hit_memory") or {}
+            hits = sum(m["hits"] for m in memory.values())
+            tried = hits + sum(m["misses"] for m in memory.values())
+            if tried:
+                parts.append(f"位置记忆命中 {hits}/{tried}")
+            self.status_label.setText("状态: 回放完成" + (f"（{'，'.join(parts)}）" if parts else ""))
             self.status_label.setStyleSheet("""
                 QLabel {
                     color: #4caf50;
@@ -1092,6 +1214,8 @@ class MacroRecorderApp(QMainWindow):
             self.task_name_edit.setText(name)
             self.loop_spin.setValue(1)
             self._set_loop_delay_seconds_to_widgets(0.0)
+            self.max_gap_spin.setValue(0.0)
+            self.idle_gaps_only_check.setChecked(True)
             self.steps_tree.clear()
 
             self.enable_task_editing()
@@ -1106,6 +1230,8 @@ class MacroRecorderApp(QMainWindow):
             self.task_name_edit.setText(self.current_task.name)
             self.loop_spin.setValue(self.current_task.loop_count)
             self._set_loop_delay_seconds_to_widgets(self.current_task.loop_delay)
+            self.max_gap_spin.setValue(self.current_task.max_gap)
+            self.idle_gaps_only_check.setChecked(self.current_task.idle_gaps_only)
 
             # 加载步骤
             self.steps_tree.clear()
@@ -1124,6 +1250,8 @@ class MacroRecorderApp(QMainWindow):
         self.current_task.name = self.task_name_edit.text()
         self.current_task.loop_count = self.loop_spin.value()
         self.current_task.loop_delay = self._get_loop_delay_seconds_from_widgets()
+        self.current_task.max_gap = self.max_gap_spin.value()
+        self.current_task.idle_gaps_only = self.idle_gaps_only_check.isChecked()
 
         # 更新任务列表
         for i in range(self.task_list_widget.count()):
@@ -1286,9 +1414,11 @@ class MacroRecorderApp(QMainWindow):
             QMessageBox.warning(self, "警告", "任务中没有可执行的步骤!")
             return
 
-        # 启动前，同步当前 UI 的循环次数与循环间隔（秒）
+        # 启动前，同步当前 UI 的循环次数、循环间隔（秒）与空闲间隔压缩设置
         self.current_task.loop_count = self.loop_spin.value()
         self.current_task.loop_delay = self._get_loop_delay_seconds_from_widgets()
+        self.current_task.max_gap = self.max_gap_spin.value()
+        self.current_task.idle_gaps_only = self.idle_gaps_only_check.isChecked()
 
         # 禁用运行按钮，启用停止按钮
         self.run_task_btn.setEnabled(False)
@@ -1311,14 +1441,51 @@ class MacroRecorderApp(QMainWindow):
         self.task_thread.daemon = True
         self.task_thread.start()
 
+    def analyze_task_gaps(self):
+        """估算当前任务在空闲间隔压缩下每轮可节省的时间"""
+        if not self.current_task or not self.current_task.steps:
+            QMessageBox.warning(self, "警告", "任务中没有可执行的步骤!")
+            return
+
+        max_gap = self.max_gap_spin.value()
+        if max_gap <= 0:
+            QMessageBox.warning(self, "警告", "请先设置最大空闲间隔")
+            return
+        idle_only = self.idle_gaps_only_check.isChecked()
+
+        lines = []
+        total = total_saved = 0.0
+        for step in self.current_task.steps:
+            if not step.enabled:
+                continue
+            try:
+                report = self.recorder.analyze_gaps(step.file_path, max_gap, idle_only)
+            except Exception as e:
+                lines.append(f"{step.name}: 分析失败 ({str(e)})")
+                continue
+            total += report["duration"] * step.repeat
+            total_saved += report["saved"] * step.repeat
+            lines.append(f"{step.name}: {report['duration']:.1f} 秒 -> {report['compressed_duration']:.1f} 秒"
+                         f"（节省 {report['saved']:.1f} 秒，压缩 {report['gaps_capped']} 处间隔）")
+
+        ratio = (total_saved / total * 100.0) if total > 0 else 0.0
+        lines.append("")
+        lines.append(f"每轮合计: {total:.1f} 秒 -> {total - total_saved:.1f} 秒（节省 {ratio:.0f}%）")
+        QMessageBox.information(self, "空闲间隔分析", "\n".join(lines))
+
     def execute_task(self):
         """执行任务的线程函数（循环间隔为“结束到开始”的固定间隔）"""
+        session = None
         try:
+            # 整个任务共用一个回放会话（控制器、智能执行器及其缓存只初始化一次）
+            session = self.recorder.open_session()
             self.current_task.is_running = True
             self.current_task.should_stop = False
 
             loop_count = self.current_task.loop_count
             loop_delay = float(self.current_task.loop_delay)
+            max_gap = float(self.current_task.max_gap)
+            idle_only = self.current_task.idle_gaps_only
 
             # 无限循环或有限循环
             current_loop = 0
@@ -1331,16 +1498,17 @@ class MacroRecorderApp(QMainWindow):
                     if not step.enabled:
                         continue
 
-                    # 加载录制
-                    self.recorder.load_recording(step.file_path)
-
                     # 执行步骤指定次数
                     for i in range(step.repeat):
                         if self.current_task.should_stop:
                             break
 
-                        # 执行录制
-                        self.recorder.play_recording()
+                        if i == 0:
+                            # 首次执行时加载录制：缓存命中不再读盘解析，大 JSON 录制边解析边回放
+                            self.recorder.play_file(step.file_path, session=session,
+                                                    max_gap=max_gap, idle_only=idle_only)
+                        else:
+                            self.recorder.play_recording(session=session, max_gap=max_gap, idle_only=idle_only)
 
                         # 执行后延迟（仅在重复之间）
                         if step.delay > 0 and i < step.repeat - 1:
@@ -1368,6 +1536,9 @@ class MacroRecorderApp(QMainWindow):
             error_msg = f"任务执行错误: {str(e)}"
             QTimer.singleShot(0, lambda: QMessageBox.critical(self, "错误", error_msg))
             QTimer.singleShot(0, self.on_task_finished)
+        finally:
+            if session is not None:
+                session.close()
 
     def stop_task(self):
         """停止当前任务"""
@@ -1433,6 +1604,9 @@ class MacroRecorderApp(QMainWindow):
         if hasattr(self, 'task_thread') and self.task_thread.is_alive():
             self.task_thread.join(1.0)  # 最多等待1秒
 
+        # 停止 OCR 工作进程
+        self.recorder.shutdown_smart()
+
         # 停止热键监听
         if hasattr(self, 'hotkey_listener') and self.hotkey_listener.running:
             self.hotkey_listener.stop()
@@ -1452,13 +1626,16 @@ class MacroRecorderApp(QMainWindow):
         self.recording_list_widget.clear()
         self.recordings.clear()
 
-        # 加载所有JSON文件
-        for filename in os.listdir(recordings_dir):
-            if filename.endswith(".json"):
-                name = os.path.splitext(filename)[0]
-                file_path = os.path.join(recordings_dir, filename)
-                self.recordings[name] = file_path
+        # 加载所有录制文件（二进制 .mrec 与旧的 JSON）；同名时优先 .mrec
+        for filename in sorted(os.listdir(recordings_dir)):
+            name, ext = os.path.splitext(filename)
+            if ext not in (RECORDING_EXT, ".json"):
+                continue
+            if name in self.recordings and ext != RECORDING_EXT:
+                continue
+            if name not in self.recordings:
                 self.recording_list_widget.addItem(name)
+            self.recordings[name] = os.path.join(recordings_dir, filename)
 
     def load_saved_tasks(self):
         """加载保存的任务"""
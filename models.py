@@ -56,6 +56,8 @@ class MacroTask:
         self.steps: List[MacroStep] = []
         self.loop_count = 1  # 循环次数，0表示无限循环
         self.loop_delay = 0.0  # 每次循环之间的延迟
+        self.max_gap = 0.0  # 回放时事件间隔上限（秒），0表示按录制原样等待
+        self.idle_gaps_only = True  # 仅压缩输入段之间（无按键/按钮按住）的间隔
         self.current_step = 0
         self.current_loop = 0
         self.is_running = False
@@ -90,6 +92,8 @@ class MacroTask:
             "name": self.name,
             "loop_count": self.loop_count,
             "loop_delay": self.loop_delay,
+            "max_gap": self.max_gap,
+            "idle_gaps_only": self.idle_gaps_only,
             "steps": [step.to_dict() for step in self.steps]
         }
 
@@ -99,6 +103,8 @@ class MacroTask:
         task = cls(name=data.get("name", "Unnamed Task"))
         task.loop_count = data.get("loop_count", 1)
         task.loop_delay = data.get("loop_delay", 0.0)
+        task.max_gap = data.get("max_gap", 0.0)
+        task.idle_gaps_only = data.get("idle_gaps_only", True)
 
         for step_data in data.get("steps", []):
             task.add_step(MacroStep.from_dict(step_data))
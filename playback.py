@@ -0,0 +1,385 @@
+import queue
+import sys
+import threading
+import time
+from array import array
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+from pynput.keyboard import Key, Controller as KeyboardController
+from pynput.mouse import Button, Controller as MouseController
+
+from event_store import (  # noqa: F401  操作码由本模块一并导出
+    EventStore, as_store,
+    OP_KEY_PRESS, OP_KEY_RELEASE, OP_MOUSE_MOVE, OP_MOUSE_PRESS, OP_MOUSE_RELEASE,
+    OP_MOUSE_SCROLL, OP_SMART, OP_IF_GUARD, OP_END_GUARD, OP_WHILE, OP_NOP, OP_SCREEN_SYNC,
+)
+from screen_sync import parse_payload as parse_sync_payload
+
+# 粗睡眠/精细自旋的切换阈值：剩余时间小于该值时改为忙等，避免 sleep 精度不足导致迟到
+_SPIN_THRESHOLD = 0.004 if sys.platform == "win32" else 0.002
+# 单次粗睡眠的最长时长，保证停止回放时能及时响应
+_MAX_SLEEP_CHUNK = 0.05
+
+
+class PlaybackClock:
+    """
+    回放时钟：每个事件锚定到绝对截止时间 origin + t / speed（单调时钟），
+    注入事件、OCR 判断等耗时不会在长录制中累积为漂移。
+    同时统计每个事件的实际迟到时间（lateness）。
+    """
+
+    def __init__(self, speed: float = 1.0,
+                 spin_threshold: float = _SPIN_THRESHOLD,
+                 max_sleep_chunk: float = _MAX_SLEEP_CHUNK):
+        self.speed = max(float(speed), 1e-6)
+        self.spin_threshold = float(spin_threshold)
+        self.max_sleep_chunk = float(max_sleep_chunk)
+        self.origin = time.perf_counter()
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        self.event_count = 0
+        self.total_lateness = 0.0
+        self.max_lateness = 0.0
+
+    def start(self, t0: float = 0.0) -> None:
+        """以当前时刻作为时间轴上的 t0"""
+        self.origin = time.perf_counter() - t0 / self.speed
+        self.reset_stats()
+
+    def rebase(self, t: float) -> None:
+        """
+        重新锚定：令时间轴上的 t 对应“现在”。
+        用于阻塞型事件（智能等待、WHILE 块、IF 跳转）之后，后续事件按相对间隔继续。
+        """
+        self.origin = time.perf_counter() - t / self.speed
+
+    def skip(self, seconds: float) -> None:
+        """时间轴上跳过 seconds 秒（空闲间隔压缩）：后续截止时间整体提前"""
+        self.origin -= seconds / self.speed
+
+    def deadline(self, t: float) -> float:
+        return self.origin + t / self.speed
+
+    def wait_until(self, t: float, should_stop: Optional[Callable[[], bool]] = None) -> float:
+        """
+        等待到时间轴 t 对应的截止时间；返回实际迟到秒数（提前到达时为 0）。
+        先分段粗睡眠，剩余不足 spin_threshold 时自旋等待。
+        若 should_stop() 为真则提前返回 0，不计入统计。
+        """
+        target = self.deadline(t)
+        now = time.perf_counter()
+        while target - now > self.spin_threshold:
+            if should_stop is not None and should_stop():
+                return 0.0
+            time.sleep(min(target - now - self.spin_threshold, self.max_sleep_chunk))
+            now = time.perf_counter()
+        while now < target:
+            now = time.perf_counter()
+
+        lateness = now - target
+        self.event_count += 1
+        self.total_lateness += lateness
+        if lateness > self.max_lateness:
+            self.max_lateness = lateness
+        return lateness
+
+    def stats(self) -> Dict[str, float]:
+        """迟到统计（秒）"""
+        n = self.event_count
+        return {
+            "events": n,
+            "mean_lateness": (self.total_lateness / n) if n else 0.0,
+            "max_lateness": self.max_lateness,
+        }
+
+
+# —— 编译后的回放计划 ——
+# 输入类操作码（0..5）可直接查 INPUT_DISPATCH 执行；其余为控制类操作码，由回放循环处理
+
+
+def resolve_key(name: Any) -> Any:
+    """键名 -> pynput Key；普通字符保持原样（Controller 可直接接受字符）"""
+    if isinstance(name, str):
+        try:
+            return getattr(Key, name)
+        except AttributeError:
+            return name
+    return name
+
+
+def _resolve_button(name: Any) -> Optional[Button]:
+    try:
+        return getattr(Button, name)
+    except (AttributeError, TypeError):
+        return None
+
+
+class PlaybackPlan:
+    """
+    事件存储（EventStore）编译后的回放计划：
+      - ops/times/xs/ys/a/b: 与事件存储共享的列（array 或内存映射的 memoryview）
+      - keys/buttons: 按编号预解析的 Key/Button 对象（不支持的按钮为 None）
+      - args:  控制类事件下标 -> 预处理参数（smart 事件、IF 负载、WHILE 负载与子计划、屏幕同步参数）
+      - if_jumps: IF 守护下标 -> 匹配 END-IF 之后的下标
+      - if_depth: IF 守护下标 -> 嵌套深度（最外层为 1）
+      - errors:   编译时发现的结构问题（IF/END-IF 不配对等）
+    回放循环只做下标访问与表分派，不再解析事件或做属性查找。
+    """
+
+    __slots__ = ("ops", "times", "xs", "ys", "a", "b", "keys", "buttons", "args",
+                 "if_jumps", "if_depth", "errors", "source", "length")
+
+    def __init__(self, source: Sequence):
+        self.ops: Sequence[int] = array("B")
+        self.times: Sequence[float] = array("d")
+        self.xs: Sequence[int] = array("i")
+        self.ys: Sequence[int] = array("i")
+        self.a: Sequence[int] = array("i")
+        self.b: Sequence[int] = array("i")
+        self.keys: List[Any] = []
+        self.buttons: List[Optional[Button]] = []
+        self.args: Dict[int, Any] = {}
+        self.if_jumps: Dict[int, int] = {}
+        self.if_depth: Dict[int, int] = {}
+        self.errors: List[str] = []
+        self.source = source
+        self.length = len(source)
+
+    def __len__(self) -> int:
+        return len(self.ops)
+
+    def is_current(self, events: Sequence) -> bool:
+        """计划是否仍对应给定事件序列（同一对象且长度未变）"""
+        return self.source is events and self.length == len(events)
+
+
+class PlanCompiler:
+    """
+    增量编译器：对只追加的事件存储，每次 update() 只处理新增的键/按钮与旁表控制事件。
+    compile_events 用于一次性编译；流式回放时随解析进度反复调用 update()。
+    """
+
+    def __init__(self, store: EventStore, source: Optional[Sequence] = None):
+        self.store = store
+        self.plan = plan = PlaybackPlan(store if source is None else source)
+        plan.ops, plan.times = store.op, store.t
+        plan.xs, plan.ys, plan.a, plan.b = store.x, store.y, store.a, store.b
+        self._open_guards: List[int] = []
+        self._payload_done = 0
+
+    def update(self) -> PlaybackPlan:
+        store, plan = self.store, self.plan
+        keys, buttons = plan.keys, plan.buttons
+        for k in store.keys[len(keys):]:
+            keys.append(resolve_key(k))
+        for name in store.buttons[len(buttons):]:
+            buttons.append(_resolve_button(name))
+
+        ops, args, open_guards = store.op, plan.args, self._open_guards
+        payload_pos = store.payload_pos
+        for pi in range(self._payload_done, len(payload_pos)):
+            i = payload_pos[pi]
+            op = ops[i]
+            if op < OP_SMART or op == OP_NOP:
+                continue
+            ev = store.payloads[store.a[i]]
+            payload = ev[1] if len(ev) >= 2 else None
+            if op == OP_SMART:
+                args[i] = ev
+            elif op == OP_IF_GUARD:
+                args[i] = dict(payload) if isinstance(payload, dict) else None
+                open_guards.append(i)
+                plan.if_depth[i] = len(open_guards)
+            elif op == OP_END_GUARD:
+                if open_guards:
+                    plan.if_jumps[open_guards.pop()] = i + 1
+                else:
+                    plan.errors.append(f"第 {i + 1} 个事件: END-IF 没有对应的 IF")
+            elif op == OP_WHILE:
+                if isinstance(payload, dict):
+                    args[i] = (payload, compile_events(payload.get("children", [])))
+                else:
+                    args[i] = None
+            elif op == OP_SCREEN_SYNC:
+                args[i] = parse_sync_payload(payload)
+        self._payload_done = len(payload_pos)
+        plan.length = len(store)
+        return plan
+
+    def finish(self) -> PlaybackPlan:
+        """事件全部到齐：报告未闭合的 IF"""
+        plan = self.update()
+        for i in self._open_guards:
+            plan.errors.append(f"第 {i + 1} 个事件: IF 缺少对应的 END-IF，回放时将忽略该条件")
+        self._open_guards = []
+        return plan
+
+
+def compile_events(events: Sequence) -> PlaybackPlan:
+    """
+    将事件序列编译为 PlaybackPlan：列数组与事件存储共享，只解析键/按钮去重表与旁表中的控制事件；
+    WHILE 块的子事件一并编译，并建立 IF 跳转表。
+    """
+    return PlanCompiler(as_store(events), events).finish()
+
+
+# —— 输入事件分派表（下标即操作码）——
+def _do_key_press(plan: PlaybackPlan, i: int, keyboard_ctrl, mouse_ctrl) -> None:
+    keyboard_ctrl.press(plan.keys[plan.a[i]])
+
+
+def _do_key_release(plan: PlaybackPlan, i: int, keyboard_ctrl, mouse_ctrl) -> None:
+    keyboard_ctrl.release(plan.keys[plan.a[i]])
+
+
+def _do_mouse_move(plan: PlaybackPlan, i: int, keyboard_ctrl, mouse_ctrl) -> None:
+    mouse_ctrl.position = (plan.xs[i], plan.ys[i])
+
+
+def _do_mouse_press(plan: PlaybackPlan, i: int, keyboard_ctrl, mouse_ctrl) -> None:
+    button = plan.buttons[plan.a[i]]
+    if button is None:  # 当前平台不支持的按钮名
+        return
+    mouse_ctrl.position = (plan.xs[i], plan.ys[i])
+    mouse_ctrl.press(button)
+
+
+def _do_mouse_release(plan: PlaybackPlan, i: int, keyboard_ctrl, mouse_ctrl) -> None:
+    button = plan.buttons[plan.a[i]]
+    if button is None:
+        return
+    mouse_ctrl.position = (plan.xs[i], plan.ys[i])
+    mouse_ctrl.release(button)
+
+
+def _do_mouse_scroll(plan: PlaybackPlan, i: int, keyboard_ctrl, mouse_ctrl) -> None:
+    dx, dy = plan.a[i], plan.b[i]
+    # 大多数网页不要求定位，但为兼容某些控件，这里先移动到位置再滚动
+    mouse_ctrl.position = (plan.xs[i], plan.ys[i])
+    try:
+        mouse_ctrl.scroll(dx, dy)
+    except Exception:
+        # 某些平台 dx 不支持，保底只滚动垂直
+        mouse_ctrl.scroll(0, dy)
+
+
+INPUT_DISPATCH = (
+    _do_key_press,
+    _do_key_release,
+    _do_mouse_move,
+    _do_mouse_press,
+    _do_mouse_release,
+    _do_mouse_scroll,
+)
+
+
+class StreamingLoader:
+    """
+    流式载入：后台线程解析录制，按批经有界队列交给回放线程；
+    回放线程调用 pull() 把批次并入事件存储并增量编译，因此可在文件解析完成前开始回放。
+    """
+
+    def __init__(self, batches: Iterable[List[Any]], queue_size: int = 64):
+        self.store = EventStore()
+        self.compiler = PlanCompiler(self.store)
+        self.plan = self.compiler.plan
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._produce, args=(batches,), daemon=True)
+        self._thread.start()
+
+    def _put(self, item: Any) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self, batches: Iterable[List[Any]]) -> None:
+        try:
+            for batch in batches:
+                if not self._put(batch):
+                    return
+                # 每批之后主动让出 GIL，避免解析线程拖慢回放线程的精细等待
+                time.sleep(0)
+        except Exception as e:
+            self._put(e)
+            return
+        self._put(None)
+
+    def pull(self) -> bool:
+        """阻塞并入下一批事件；全部到齐（或解析出错）时返回 False"""
+        if self.done:
+            return False
+        item = self._queue.get()
+        if item is None or isinstance(item, BaseException):
+            if item is not None:
+                self.error = item
+            self.done = True
+            self.compiler.finish()
+            return False
+        self.store.extend(item)
+        self.compiler.update()
+        return True
+
+    def try_pull(self) -> bool:
+        """非阻塞：有已解析的批次时并入并返回 True"""
+        if self.done or self._queue.empty():
+            return False
+        return self.pull()
+
+    def drain(self) -> None:
+        while self.pull():
+            pass
+
+    def close(self) -> None:
+        self._stop.set()
+
+
+class PlaybackSession:
+    """
+    长生命周期的回放会话：持有键鼠控制器、智能执行器（及其缓存）等资源，
+    在整个任务运行期间被各步骤、各次重复和各轮循环复用，只付一次初始化成本。
+    """
+
+    def __init__(self, smart_factory: Optional[Callable[["PlaybackSession"], Any]] = None):
+        self.keyboard = KeyboardController()
+        self.mouse = MouseController()
+        self._smart_factory = smart_factory
+        self._smart: Any = None
+        self._smart_failed = False
+        self.closed = False
+
+    @property
+    def smart(self) -> Any:
+        """智能执行器（首次使用时以本会话为参数调用工厂创建，可共用会话的键鼠控制器；不可用时为 None）"""
+        if self._smart is None and not self._smart_failed and self._smart_factory is not None:
+            try:
+                self._smart = self._smart_factory(self)
+            except Exception:
+                self._smart_failed = True
+        return self._smart
+
+    def close(self) -> None:
+        """释放会话持有的资源（智能执行器的截图句柄、缓存等）"""
+        if self.closed:
+            return
+        self.closed = True
+        smart, self._smart = self._smart, None
+        close = getattr(smart, "close", None)
+        if close is not None:
+            try:
+                close()
+            except Exception:
+                pass
+
+    def __enter__(self) -> "PlaybackSession":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
@@ -1,59 +1,145 @@
 import json
+import os
 import time
-from typing import List, Tuple, Union, Optional
+from typing import List, Optional, Sequence, Tuple, Union
 from pynput import keyboard, mouse
-from pynput.keyboard import Key, KeyCode, Controller as KeyboardController
-from pynput.mouse import Button, Controller as MouseController
+from pynput.keyboard import Key, KeyCode
+from pynput.mouse import Button
+
+from capture import CaptureDrainer, CaptureRing
+from compaction import MoveDecimator, compact_events
+from idle_gaps import GapLimiter, analyze_gaps
+import screen_sync
+from screen_sync import ScreenSampler, ScreenSyncStage
+from event_store import EventStore, MappedEventStore, as_store
+from recording_cache import RecordingCache
+from recording_format import (
+    is_binary_recording, iter_json_batches, map_recording, read_recording, write_recording,
+)
+from playback import (
+    PlaybackClock, PlaybackPlan, PlaybackSession, StreamingLoader, compile_events, INPUT_DISPATCH,
+    OP_MOUSE_SCROLL, OP_SMART, OP_IF_GUARD, OP_END_GUARD, OP_WHILE, OP_NOP, OP_SCREEN_SYNC,
+)
 
 # 智能执行器（可选）
 try:
     from smart.runtime import SmartExecutor  # type: ignore
+    from smart.ocr_utils import warm_up as warm_up_ocr, stop_ocr_pool  # type: ignore
 except Exception:
     SmartExecutor = None
+    warm_up_ocr = None
+    stop_ocr_pool = None
+
+
+# 事件数达到该值的录制默认以未压缩二进制保存，载入时可内存映射
+MMAP_MIN_EVENTS = 200_000
+# 超过该大小的 JSON 录制在任务执行时边解析边回放
+STREAM_MIN_BYTES = 4 * 1024 * 1024
+# 流式回放时，剩余未播放的已载入事件少于该值即趁空闲拉取下一批
+STREAM_LOW_WATER = 4096
+
+
+def _export_json(filename: str, events) -> None:
+    # 逐条写出 JSON 数组，避免为大录制先构造完整的事件列表
+    with open(filename, 'w') as f:
+        f.write('[')
+        for i, ev in enumerate(events):
+            if i:
+                f.write(', ')
+            f.write(json.dumps(ev))
+        f.write(']')
 
 
 class KeyMouseRecorder:
     """键盘鼠标操作记录器类，实现录制和回放功能（含滚轮/IF/WHILE/智能识别）"""
 
-    def __init__(self):
-        self.recorded_events: List[Tuple] = []
+    def __init__(self, cache_bytes: int = 256 * 1024 * 1024):
+        self._events = EventStore()
         self.start_time: Optional[float] = None
         self.is_recording: bool = False
         self.is_playing: bool = False
         self.keyboard_listener: Optional[keyboard.Listener] = None
         self.mouse_listener: Optional[mouse.Listener] = None
         self.stop_playback_flag = False
-
+        # 最近一次回放的迟到统计（见 PlaybackClock.stats）
+        self.last_playback_stats: dict = {}
+        # recorded_events 的编译缓存（见 playback_plan）
+        self._plan: Optional[PlaybackPlan] = None
+        # 最近一次 load_recording 编译时发现的问题（IF/END-IF 不配对等）
+        self.load_warnings: List[str] = []
+        # 已解析+已编译录制的 LRU 缓存（任务循环执行时避免反复读盘解析）
+        self.recording_cache = RecordingCache(max_bytes=cache_bytes)
+        # 录制捕获：监听线程写入环形缓冲，排空线程写入事件存储
+        self._keyboard_ring = CaptureRing()
+        self._mouse_ring = CaptureRing()
+        self._drainer: Optional[CaptureDrainer] = None
+        # 鼠标移动精简：录制时按距离(像素)/时间(秒)阈值抽稀，停止录制后按 RDP 容差(像素)简化；0 表示关闭
+        self.capture_min_distance = 0.0
+        self.capture_min_interval = 0.0
+        self.compaction_epsilon = 0.0
+        self._decimator: Optional[MoveDecimator] = None
+        # 最近一次录制或精简移除的事件数
+        self.last_compaction_removed = 0
+        # 屏幕就绪同步：录制时在间隔不短于 screen_sync_min_delay 秒的点击前保存区域指纹，
+        # 回放时画面一致即提前点击，录制的延迟作为超时
+        self.screen_sync = False
+        self.screen_sync_min_delay = 0.2
+        self._sampler: Optional[ScreenSampler] = None
+        # 回放会话中智能执行器的后台截屏帧率（0 表示每次判断时直接截屏）
+        self.frame_grabber_fps = 0.0
+        # OCR 工作进程数（0 表示在回放线程内识别）；由启动参数 --ocr-workers 设置
+        self.ocr_workers = 0
+        # 智能动作点击前的鼠标移动耗时与到位后的停顿（秒），键鼠注入与回放共用会话的控制器
+        self.smart_move_duration = 0.0
+        self.smart_settle = 0.015
+
+    @property
+    def recorded_events(self) -> EventStore:
+        """当前录制（列式存储，保持列表式接口）"""
+        return self._events
+
+    @recorded_events.setter
+    def recorded_events(self, events: Sequence) -> None:
+        # 允许外部（如自定义过程）直接赋值普通列表，统一转换为列式存储
+        self._events = as_store(events)
+        # 旧计划引用旧的事件存储（可能是内存映射），一并丢弃
+        self._plan = None
+
+    def _should_stop(self) -> bool:
+        return self.stop_playback_flag
+
+    # —— 捕获回调：只取时间戳并写入环形缓冲，转换与入库由排空线程完成 ——
     def on_press(self, key: Union[Key, KeyCode, None]) -> None:
+        t0 = time.perf_counter_ns()
         if not self.is_recording or key is None:
             return
-        timestamp = time.time() - self.start_time  # type: ignore
-        if isinstance(key, KeyCode):
-            self.recorded_events.append(('key_press', key.char, timestamp))
-        elif isinstance(key, Key):
-            self.recorded_events.append(('key_press', key.name, timestamp))
+        ring = self._keyboard_ring
+        ring.push((t0, 'key_press', key))
+        ring.record_latency(time.perf_counter_ns() - t0)
 
     def on_release(self, key: Union[Key, KeyCode, None]) -> None:
+        t0 = time.perf_counter_ns()
         if not self.is_recording or key is None:
             return
-        timestamp = time.time() - self.start_time  # type: ignore
-        if isinstance(key, KeyCode):
-            self.recorded_events.append(('key_release', key.char, timestamp))
-        elif isinstance(key, Key):
-            self.recorded_events.append(('key_release', key.name, timestamp))
+        ring = self._keyboard_ring
+        ring.push((t0, 'key_release', key))
+        ring.record_latency(time.perf_counter_ns() - t0)
 
     def on_move(self, x: int, y: int) -> None:
+        t0 = time.perf_counter_ns()
         if not self.is_recording:
             return
-        timestamp = time.time() - self.start_time  # type: ignore
-        self.recorded_events.append(('mouse_move', (x, y), timestamp))
+        ring = self._mouse_ring
+        ring.push((t0, 'mouse_move', x, y))
+        ring.record_latency(time.perf_counter_ns() - t0)
 
     def on_click(self, x: int, y: int, button: Button, pressed: bool) -> None:
+        t0 = time.perf_counter_ns()
         if not self.is_recording:
             return
-        timestamp = time.time() - self.start_time  # type: ignore
-        action = 'mouse_press' if pressed else 'mouse_release'
-        self.recorded_events.append((action, button.name, (x, y), timestamp))
+        ring = self._mouse_ring
+        ring.push((t0, 'mouse_press' if pressed else 'mouse_release', x, y, button))
+        ring.record_latency(time.perf_counter_ns() - t0)
 
     # 新增：滚轮事件
     def on_scroll(self, x: int, y: int, dx: int, dy: int) -> None:
@@ -62,15 +148,49 @@ class KeyMouseRecorder:
         事件格式（保存为 list 时）统一在回放前转换，这里保持 tuple 兼容：
           ('mouse_scroll', (dx, dy), (x, y), t)
         """
+        t0 = time.perf_counter_ns()
         if not self.is_recording:
             return
-        timestamp = time.time() - self.start_time  # type: ignore
-        self.recorded_events.append(('mouse_scroll', (int(dx), int(dy)), (x, y), timestamp))
+        ring = self._mouse_ring
+        ring.push((t0, 'mouse_scroll', x, y, dx, dy))
+        ring.record_latency(time.perf_counter_ns() - t0)
+
+    @staticmethod
+    def _capture_to_event(item: tuple, timestamp: float):
+        """环形缓冲中的原始捕获项 -> 录制事件 tuple"""
+        kind = item[1]
+        if kind == 'mouse_move':
+            return ('mouse_move', (item[2], item[3]), timestamp)
+        if kind == 'mouse_press' or kind == 'mouse_release':
+            return (kind, item[4].name, (item[2], item[3]), timestamp)
+        if kind == 'mouse_scroll':
+            return ('mouse_scroll', (int(item[4]), int(item[5])), (item[2], item[3]), timestamp)
+        key = item[2]
+        if isinstance(key, KeyCode):
+            return (kind, key.char, timestamp)
+        if isinstance(key, Key):
+            return (kind, key.name, timestamp)
+        return None
 
     def start_recording(self) -> None:
         self.recorded_events = []
-        self.is_recording = True
+        self._keyboard_ring = CaptureRing()
+        self._mouse_ring = CaptureRing()
         self.start_time = time.time()
+        start_ns = time.perf_counter_ns()
+        sink = self.recorded_events.append
+        self._sampler = None
+        if self.screen_sync and screen_sync.available():
+            self._sampler = ScreenSampler(start_ns)
+            self._sampler.start()
+            sink = ScreenSyncStage(sink, self._sampler, self.screen_sync_min_delay)
+        self._decimator = None
+        if self.capture_min_distance > 0 or self.capture_min_interval > 0:
+            self._decimator = sink = MoveDecimator(sink, self.capture_min_distance, self.capture_min_interval)
+        self._drainer = CaptureDrainer((self._keyboard_ring, self._mouse_ring), sink,
+                                       start_ns, self._capture_to_event)
+        self._drainer.start()
+        self.is_recording = True
         self.keyboard_listener = keyboard.Listener(on_press=self.on_press, on_release=self.on_release)
         self.keyboard_listener.start()
         # 监听滚轮 on_scroll
@@ -83,78 +203,163 @@ class KeyMouseRecorder:
             self.keyboard_listener.stop()
         if self.mouse_listener:
             self.mouse_listener.stop()
+        if self._sampler is not None:
+            # 先停止采样；已有的采样保留，供最后一次排空时查找
+            self._sampler.stop()
+        if self._drainer is not None:
+            self._drainer.stop()
+        removed = self._decimator.removed if self._decimator is not None else 0
+        if self.compaction_epsilon > 0:
+            removed += self.compact_recording(epsilon=self.compaction_epsilon)
+        self.last_compaction_removed = removed
+
+    def compact_recording(self, min_distance: float = 0.0, min_interval: float = 0.0, epsilon: float = 0.0) -> int:
+        """精简当前录制中的鼠标移动（见 compaction.compact_events），返回移除的事件数"""
+        store, removed = compact_events(self.recorded_events, min_distance, min_interval, epsilon)
+        if removed:
+            self.recorded_events = store
+        self.last_compaction_removed = removed
+        return removed
+
+    def compact_file(self, filename: str, min_distance: float = 0.0, min_interval: float = 0.0,
+                     epsilon: float = 0.0, output: Optional[str] = None) -> int:
+        """批量精简已保存的录制文件（默认原地覆盖），返回移除的事件数"""
+        store, removed = compact_events(self._read_file(filename), min_distance, min_interval, epsilon)
+        target = output or filename
+        if removed or target != filename:
+            self.detach_file(target)
+            self._write_file(target, store)
+            self.recording_cache.invalidate(target)
+        self.last_compaction_removed = removed
+        return removed
+
+    def capture_stats(self) -> dict:
+        """录制捕获统计：回调次数、丢弃事件数、回调平均/最大耗时（微秒）"""
+        if self._drainer is None:
+            return {}
+        return self._drainer.stats()
+
+    def save_recording(self, filename: str, fmt: Optional[str] = None, compression: Optional[str] = None) -> None:
+        """
+        保存录制。fmt: "json" / "binary"；缺省按扩展名判断（.json 为 JSON，其余为二进制）。
+        compression 仅对二进制格式有效："zlib" / "lzma" / "none"；
+        缺省时大录制不压缩（便于内存映射懒加载），其余使用 zlib。
+        """
+        # 当前录制若映射自目标文件，先复制到内存再覆盖
+        self.detach_file(filename)
+        self._write_file(filename, self.recorded_events, fmt, compression)
+        self.recording_cache.invalidate(filename)
+
+    @staticmethod
+    def _write_file(filename: str, store: EventStore, fmt: Optional[str] = None,
+                    compression: Optional[str] = None) -> None:
+        if fmt is None:
+            fmt = "json" if filename.lower().endswith(".json") else "binary"
+        if fmt == "json":
+            _export_json(filename, store)
+        else:
+            if compression is None:
+                compression = "none" if len(store) >= MMAP_MIN_EVENTS else "zlib"
+            write_recording(filename, store, compression)
+
+    def detach_file(self, filename: str) -> None:
+        """
+        解除对 filename 的内存映射引用（覆盖或删除该文件前调用）：
+        当前录制映射自该文件时复制到内存，同时丢弃缓存中的映射条目及引用该映射的回放计划。
+        """
+        self.recording_cache.invalidate(filename)
+        path = os.path.abspath(filename)
+
+        def maps_file(store) -> bool:
+            return isinstance(store, MappedEventStore) and os.path.abspath(store.filename) == path
+
+        if self._plan is not None and maps_file(self._plan.source):
+            self._plan = None
+        events = self.recorded_events
+        if maps_file(events):
+            self.recorded_events = events.materialize()
+
+    def export_json(self, filename: str) -> None:
+        _export_json(filename, self.recorded_events)
 
-    def save_recording(self, filename: str) -> None:
-        # 将 tuple 统一转换为 list，便于 JSON 序列化
-        serializable = []
-        for e in self.recorded_events:
-            if isinstance(e, tuple):
-                serializable.append(list(e))
-            else:
-                serializable.append(e)
-        with open(filename, 'w') as f:
-            json.dump(serializable, f)
-
-    def load_recording(self, filename: str) -> None:
+    def load_recording(self, filename: str, use_cache: bool = False, lazy: bool = False) -> None:
+        """
+        载入录制并编译回放计划。
+        use_cache=True 时优先使用内存缓存（按路径+mtime/size 校验），未命中再读盘解析并写入缓存。
+        lazy=True 时对未压缩的二进制录制使用内存映射，按需读取事件；其它格式照常完整载入。
+        """
+        if use_cache:
+            cached = self.recording_cache.get(filename)
+            if cached is not None:
+                self.recorded_events, self._plan = cached
+                self.load_warnings = list(self._plan.errors)
+                return
+        self._load_file(filename, lazy, use_cache)
+
+    def _load_file(self, filename: str, lazy: bool, cache: bool) -> None:
+        """读盘载入并编译（不查缓存）；cache=True 时写入缓存"""
+        mapped = map_recording(filename) if lazy else None
+        self.recorded_events = mapped if mapped is not None else self._read_file(filename)
+        # 载入时即编译回放计划，重复回放无需再解析事件；结构问题在此时暴露
+        plan = self.playback_plan()
+        self.load_warnings = list(plan.errors)
+        if cache:
+            self.recording_cache.put(filename, self.recorded_events, plan)
+
+    @staticmethod
+    def _read_file(filename: str) -> EventStore:
+        # 按魔数识别格式：二进制录制或旧的 JSON 数组
+        if is_binary_recording(filename):
+            return read_recording(filename)
         with open(filename, 'r') as f:
-            self.recorded_events = json.load(f)
+            return EventStore.from_events(json.load(f))
+
+    def playback_plan(self) -> PlaybackPlan:
+        """返回当前 recorded_events 的编译计划；事件被替换或追加后自动重新编译"""
+        plan = self._plan
+        if plan is None or not plan.is_current(self.recorded_events):
+            plan = compile_events(self.recorded_events)
+            self._plan = plan
+        return plan
 
     # —— 内部工具 ——
-    def _exec_event_immediate(self, ev, keyboard_ctrl, mouse_ctrl, smart) -> None:
-        """立即执行一条事件，不基于全局时间轴延迟（延迟由调用方控制）"""
-        et = ev[0]
-        if smart is not None and isinstance(et, str) and et.startswith("smart_") and et not in ("smart_if_guard_ocr", "smart_end_guard", "smart_while_ocr"):
+    def _exec_plan_immediate(self, plan: PlaybackPlan, i: int, keyboard_ctrl, mouse_ctrl, smart) -> None:
+        """立即执行计划中的第 i 条事件，不基于全局时间轴延迟（延迟由调用方控制）"""
+        op = plan.ops[i]
+        if op <= OP_MOUSE_SCROLL:
+            INPUT_DISPATCH[op](plan, i, keyboard_ctrl, mouse_ctrl)
+        elif op == OP_SMART and smart is not None:
             try:
-                smart.handle(list(ev))
+                smart.handle(plan.args[i])
             except Exception:
                 pass
-            return
 
-        if et == 'key_press':
-            key = ev[1]
-            try:
-                key_obj = getattr(Key, key)
-            except AttributeError:
-                key_obj = key
-            keyboard_ctrl.press(key_obj)
-
-        elif et == 'key_release':
-            key = ev[1]
-            try:
-                key_obj = getattr(Key, key)
-            except AttributeError:
-                key_obj = key
-            keyboard_ctrl.release(key_obj)
-
-        elif et == 'mouse_move':
-            x, y = ev[1]
-            mouse_ctrl.position = (x, y)
-
-        elif et == 'mouse_press':
-            button = getattr(Button, ev[1])
-            x, y = ev[2]
-            mouse_ctrl.position = (x, y)
-            mouse_ctrl.press(button)
-
-        elif et == 'mouse_release':
-            button = getattr(Button, ev[1])
-            x, y = ev[2]
-            mouse_ctrl.position = (x, y)
-            mouse_ctrl.release(button)
-
-        elif et == 'mouse_scroll':
-            # ev: ["mouse_scroll", [dx, dy], [x, y], t]
-            dx, dy = ev[1]
-            x, y = ev[2]
-            # 大多数网页不要求定位，但为兼容某些控件，这里先移动到位置再滚动
-            mouse_ctrl.position = (x, y)
-            try:
-                mouse_ctrl.scroll(int(dx), int(dy))
-            except Exception:
-                # 某些平台 dx 不支持，保底只滚动垂直
-                mouse_ctrl.scroll(0, int(dy))
-
-    def _run_while_block(self, payload: dict, keyboard_ctrl, mouse_ctrl, smart, speed: float = 1.0) -> None:
+    @staticmethod
+    def _check_conditions(smart, guards: List[dict], now: float,
+                          extra: Optional[dict] = None) -> Tuple[bool, Optional[int]]:
+        """
+        判断到期的 IF 守护（guards 外层在前）及可选的额外条件（WHILE 条件），识别合为一次请求。
+        返回 (额外条件是否满足, 条件满足的最外层守护在 guards 中的下标或 None)
+        """
+        due = [g for g in guards if now >= g["next_check"]]
+        payloads = [g["payload"] for g in due]
+        if extra is not None:
+            payloads.append(extra)
+        if not payloads:
+            return False, None
+        try:
+            met = smart.conditions_met(payloads)
+        except Exception:
+            met = [False] * len(payloads)
+        extra_met = extra is not None and bool(met[-1])
+        for g, ok in zip(due, met):
+            if ok:
+                return extra_met, guards.index(g)
+            g["next_check"] = now + g["interval"]
+        return extra_met, None
+
+    def _run_while_block(self, payload: dict, children: PlaybackPlan, keyboard_ctrl, mouse_ctrl, smart,
+                         speed: float = 1.0, guards: Optional[List[dict]] = None) -> Optional[int]:
         """
         执行 while 块:
           - payload: {
@@ -162,9 +367,13 @@ class KeyMouseRecorder:
               max_duration, max_loops,
               children: [ [event,..., t_rel], ... ]
             }
+          - children: payload["children"] 的编译计划
+          - guards: 外层打开的 IF 守护，与 WHILE 条件一并判断
+        返回条件满足而需跳出的外层守护在 guards 中的下标；正常结束返回 None
         """
         if smart is None:
-            return
+            return None
+        guards = guards if guards is not None else []
         cond_payload = {
             "keywords": payload.get("keywords", []),
             "region": payload.get("region"),
@@ -174,18 +383,17 @@ class KeyMouseRecorder:
         interval = float(payload.get("interval", 0.3))
         max_duration = float(payload.get("max_duration", 30.0))
         max_loops = int(payload.get("max_loops", 200))
-        children = payload.get("children", [])
+        ops, times = children.ops, children.times
 
         start_time = time.time()
         next_check = 0.0
         loops = 0
+        clock = PlaybackClock(speed)
 
         # 首次检查
-        try:
-            if smart.condition_met(cond_payload):
-                return
-        except Exception:
-            pass
+        done, fired = self._check_conditions(smart, guards, time.time(), cond_payload)
+        if done or fired is not None:
+            return fired
 
         while True:
             if self.stop_playback_flag:
@@ -195,184 +403,278 @@ class KeyMouseRecorder:
             if loops >= max_loops:
                 break
 
-            prev_t = None
-            for ev in children:
+            # 每轮子事件以本轮开始时刻为原点（子事件时间戳为相对值）
+            clock.rebase(0.0)
+            for j in range(len(ops)):
                 if self.stop_playback_flag:
                     break
+                op = ops[j]
+                if op == OP_NOP:
+                    continue
 
                 if time.time() >= next_check:
-                    try:
-                        if smart.condition_met(cond_payload):
-                            return
-                    except Exception:
-                        pass
+                    done, fired = self._check_conditions(smart, guards, time.time(), cond_payload)
+                    if done or fired is not None:
+                        return fired
                     next_check = time.time() + interval
 
-                t_rel = float(ev[-1])
-                if prev_t is None:
-                    delay = t_rel / max(speed, 1e-6)
-                else:
-                    delay = (t_rel - prev_t) / max(speed, 1e-6)
-                if delay > 0:
-                    time.sleep(delay)
-                prev_t = t_rel
+                clock.wait_until(times[j], self._should_stop)
+                if self.stop_playback_flag:
+                    break
 
-                self._exec_event_immediate(ev, keyboard_ctrl, mouse_ctrl, smart)
+                self._exec_plan_immediate(children, j, keyboard_ctrl, mouse_ctrl, smart)
 
-            try:
-                if smart.condition_met(cond_payload):
-                    return
-            except Exception:
-                pass
+            done, fired = self._check_conditions(smart, guards, time.time(), cond_payload)
+            if done or fired is not None:
+                return fired
 
             loops += 1
-
-    # —— IF 配对查找 ——
-    def _find_matching_end_guard(self, start_index: int) -> Optional[int]:
-        depth = 1
-        i = start_index + 1
-        n = len(self.recorded_events)
-        while i < n:
-            ev = self.recorded_events[i]
-            et = ev[0] if isinstance(ev, (list, tuple)) and ev else None
-            if et == "smart_if_guard_ocr":
-                depth += 1
-            elif et == "smart_end_guard":
-                depth -= 1
-                if depth == 0:
-                    return i + 1
-            i += 1
         return None
 
-    def play_recording(self, speed: float = 1.0) -> None:
+    def open_session(self) -> PlaybackSession:
+        """创建回放会话；任务执行时在多次 play_recording 之间复用"""
+        if SmartExecutor is None:
+            return PlaybackSession(None)
+        # 无界面运行时也提前在后台加载 OCR 引擎（已在加载或已就绪时不重复）
+        warm_up_ocr(workers=self.ocr_workers)
+        fps, move_duration, settle = self.frame_grabber_fps, self.smart_move_duration, self.smart_settle
+        return PlaybackSession(lambda session: SmartExecutor(
+            frame_fps=fps, mouse=session.mouse, keyboard=session.keyboard,
+            move_duration=move_duration, settle=settle))
+
+    def shutdown_smart(self) -> None:
+        """退出时停止 OCR 工作进程（未启用进程池时无操作）"""
+        if stop_ocr_pool is not None:
+            stop_ocr_pool()
+
+    def play_recording(self, speed: float = 1.0, session: Optional[PlaybackSession] = None,
+                       max_gap: float = 0.0, idle_only: bool = True) -> None:
+        """
+        回放当前录制。max_gap > 0 时启用空闲间隔压缩：事件间隔最多等待 max_gap 秒（录制时间轴），
+        idle_only=True 时仅压缩无按键/按钮按住的间隔（见 idle_gaps.GapLimiter）。
+        """
         if not self.recorded_events:
             return
 
+        if session is None:
+            # 单次回放：临时会话，结束即释放
+            with self.open_session() as temp_session:
+                self.play_recording(speed, temp_session, max_gap, idle_only)
+            return
+
+        self._play_plan(self.playback_plan(), speed, session, max_gap=max_gap, idle_only=idle_only)
+
+    def play_stream(self, filename: str, speed: float = 1.0, session: Optional[PlaybackSession] = None,
+                    use_cache: bool = False, max_gap: float = 0.0, idle_only: bool = True) -> None:
+        """
+        边解析边回放 JSON 录制：解析线程经有界队列供给事件，回放无需等待整个文件载入。
+        回放结束（或被停止）后补齐剩余解析，recorded_events 即为完整录制。
+        """
+        if session is None:
+            with self.open_session() as temp_session:
+                self.play_stream(filename, speed, temp_session, use_cache, max_gap, idle_only)
+            return
+
+        loader = StreamingLoader(iter_json_batches(filename, batch_size=256))
+        self.recorded_events = loader.store
+        self._plan = loader.plan
+        try:
+            self._play_plan(loader.plan, speed, session, loader, max_gap, idle_only)
+            loader.drain()
+        finally:
+            loader.close()
+        if loader.error is not None:
+            raise loader.error
+        self.load_warnings = list(loader.plan.errors)
+        if use_cache:
+            self.recording_cache.put(filename, loader.store, loader.plan)
+
+    def play_file(self, filename: str, speed: float = 1.0, session: Optional[PlaybackSession] = None,
+                  max_gap: float = 0.0, idle_only: bool = True) -> None:
+        """
+        载入并回放录制文件：缓存命中直接回放；较大的 JSON 录制边解析边回放；其余先载入再回放。
+        """
+        cached = self.recording_cache.get(filename)
+        if cached is not None:
+            self.recorded_events, self._plan = cached
+            self.load_warnings = list(self._plan.errors)
+        elif os.path.getsize(filename) >= STREAM_MIN_BYTES and not is_binary_recording(filename):
+            self.play_stream(filename, speed, session, use_cache=True, max_gap=max_gap, idle_only=idle_only)
+            return
+        else:
+            # 已确认未命中：直接读盘，不再重复查缓存
+            self._load_file(filename, lazy=True, cache=True)
+        self.play_recording(speed, session, max_gap, idle_only)
+
+    def analyze_gaps(self, filename: Optional[str] = None, max_gap: float = 1.0, idle_only: bool = True,
+                     speed: float = 1.0) -> dict:
+        """
+        空闲间隔压缩分析：返回录制时长、压缩后时长与可节省的时间（秒），不回放。
+        filename 为空时分析当前录制。
+        """
+        if filename is None:
+            events = self.recorded_events
+        else:
+            cached = self.recording_cache.get(filename)
+            events = cached[0] if cached is not None else self._read_file(filename)
+        return analyze_gaps(events, max_gap, idle_only, speed)
+
+    def _play_plan(self, plan: PlaybackPlan, speed: float, session: PlaybackSession,
+                   feed: Optional[StreamingLoader] = None, max_gap: float = 0.0, idle_only: bool = True) -> None:
+        """
+        回放主循环。feed 非空时计划随解析进度增长：
+        播放到已载入事件的末尾，或 IF 的配对 END-IF 尚未解析时，从 feed 拉取后续批次。
+        max_gap > 0 时压缩超长的空闲间隔。
+        """
         self.is_playing = True
         self.stop_playback_flag = False
 
-        keyboard_ctrl = KeyboardController()
-        mouse_ctrl = MouseController()
+        keyboard_ctrl = session.keyboard
+        mouse_ctrl = session.mouse
+        smart = session.smart
 
-        smart = SmartExecutor() if SmartExecutor is not None else None
+        ops, times, args, codes = plan.ops, plan.times, plan.args, plan.a
+        if_jumps = plan.if_jumps
+        dispatch = INPUT_DISPATCH
+        limiter = GapLimiter(max_gap, idle_only) if max_gap > 0 else None
+        sync_hits = sync_misses = 0
 
         i = 0
-        n = len(self.recorded_events)
-        last_timestamp = 0.0
-        active_guard = None  # IF 区间守护
+        n = len(ops)
+        guards: List[dict] = []  # 打开的 IF 区间守护（嵌套时外层在前）
+        clock = PlaybackClock(speed)
+        if feed is not None and n == 0 and feed.pull():
+            # 等首批事件到达后再启动时钟
+            n = len(ops)
+        clock.start()
 
-        while i < n:
+        while True:
+            if i >= n:
+                if feed is not None and feed.pull():
+                    n = len(ops)
+                    # 解析落后于回放时钟：从上一事件起重新锚定，避免之后集中补发
+                    if i > 0 and clock.deadline(times[i]) < time.perf_counter():
+                        clock.rebase(times[i - 1])
+                    continue
+                break
             if self.stop_playback_flag:
                 break
-            event = self.recorded_events[i]
-            if not isinstance(event, (list, tuple)) or not event:
+            op = ops[i]
+            if op == OP_NOP:
                 i += 1
                 continue
 
-            etype = event[0]
-            current_timestamp = event[-1]
-
-            # IF 区间内周期判断
-            if active_guard and i < active_guard["end_index"]:
-                if smart is not None and time.time() >= active_guard["next_check"]:
-                    if smart.condition_met(active_guard["payload"]):
-                        jump_to = active_guard["end_index"]
+            current_timestamp = times[i]
+
+            # IF 区间内周期判断：打开的守护（含嵌套）中到期的一并判断，条件满足的最外层守护跳到其 END-IF 之后
+            if guards:
+                if i >= guards[-1]["end_index"]:
+                    guards = [g for g in guards if i < g["end_index"]]
+                if guards and smart is not None:
+                    _, k = self._check_conditions(smart, guards, time.time())
+                    if k is not None:
+                        jump_to = guards[k]["end_index"]
+                        del guards[k:]
                         if jump_to < n:
-                            last_timestamp = self.recorded_events[jump_to][-1]
+                            # 跳过的区间不占用时间轴：跳转目标立即执行
+                            clock.rebase(times[jump_to])
+                            if limiter is not None:
+                                limiter.reset(times[jump_to])
                         i = jump_to
-                        active_guard = None
                         continue
-                    else:
-                        active_guard["next_check"] = time.time() + active_guard["interval"]
-            else:
-                active_guard = None
 
-            # 按时间轴延迟
-            delay = (current_timestamp - last_timestamp) / max(speed, 1e-6)
-            if delay > 0:
-                time.sleep(delay)
-            last_timestamp = current_timestamp
+            # 流式载入：趁距截止时间尚有余量时并入已解析的批次，避免在事件到期时才阻塞拉取
+            if feed is not None and n - i < STREAM_LOW_WATER and clock.deadline(current_timestamp) - time.perf_counter() > 0.001:
+                if feed.try_pull():
+                    n = len(ops)
+
+            # 空闲间隔压缩：超出 max_gap 的部分从时间轴上跳过
+            if limiter is not None:
+                skip = limiter.step(op, current_timestamp, codes[i])
+                if skip:
+                    clock.skip(skip)
+
+            # 按绝对时间轴等待（不受事件注入/判断耗时影响）
+            clock.wait_until(current_timestamp, self._should_stop)
+            if self.stop_playback_flag:
+                break
+
+            # 原有事件 + 滚轮事件：查表分派
+            if op <= OP_MOUSE_SCROLL:
+                dispatch[op](plan, i, keyboard_ctrl, mouse_ctrl)
 
             # IF 守护开始
-            if etype == "smart_if_guard_ocr":
-                if smart is not None and isinstance(event[1], dict):
-                    end_index = self._find_matching_end_guard(i)
+            elif op == OP_IF_GUARD:
+                payload = args.get(i)
+                if smart is not None and payload is not None:
+                    end_index = if_jumps.get(i)
+                    # 流式载入时配对的 END-IF 可能尚未解析：继续拉取直到找到或文件结束
+                    while end_index is None and feed is not None and feed.pull():
+                        end_index = if_jumps.get(i)
+                    n = len(ops)
+                    # 未配对（缺少 END-IF）的守护不生效
                     if end_index is not None:
-                        payload = dict(event[1])
                         interval = float(payload.get("interval", 0.3))
-                        active_guard = {"end_index": end_index, "next_check": 0.0, "interval": interval, "payload": payload}
-                i += 1
-                continue
+                        guards.append({"end_index": end_index, "next_check": 0.0, "interval": interval, "payload": payload})
 
-            # IF 守护结束
-            if etype == "smart_end_guard":
-                active_guard = None
-                i += 1
-                continue
+            # IF 守护结束（没有对应 IF 的 END-IF 不影响外层守护）
+            elif op == OP_END_GUARD:
+                if guards and guards[-1]["end_index"] == i + 1:
+                    guards.pop()
 
             # WHILE 块
-            if etype == "smart_while_ocr":
-                if smart is not None and isinstance(event[1], dict):
+            elif op == OP_WHILE:
+                if smart is not None and args.get(i) is not None:
+                    payload, children = args[i]
                     try:
-                        self._run_while_block(event[1], keyboard_ctrl, mouse_ctrl, smart, speed)
+                        k = self._run_while_block(payload, children, keyboard_ctrl, mouse_ctrl, smart, speed, guards)
                     except Exception:
-                        pass
-                i += 1
-                continue
+                        k = None
+                    if k is not None:
+                        # 外层守护条件在 WHILE 执行期间满足：跳到其 END-IF 之后
+                        jump_to = guards[k]["end_index"]
+                        del guards[k:]
+                        if jump_to < n:
+                            clock.rebase(times[jump_to])
+                            if limiter is not None:
+                                limiter.reset(times[jump_to])
+                        i = jump_to
+                        continue
+                    # WHILE 块阻塞期间不计入时间轴，后续事件按相对间隔继续
+                    clock.rebase(current_timestamp)
+
+            # 屏幕就绪同步：画面与录制时一致即提前执行下一次点击，最多等待录制的延迟
+            elif op == OP_SCREEN_SYNC:
+                sync = args.get(i)
+                if sync is not None:
+                    target = current_timestamp + sync["timeout"]
+                    wait = limiter.cap(sync["timeout"]) if limiter is not None else sync["timeout"]
+                    if screen_sync.wait_for_match(sync, clock.deadline(current_timestamp + wait), self._should_stop):
+                        clock.rebase(target)
+                        if limiter is not None:
+                            limiter.reset(target)
+                        sync_hits += 1
+                    else:
+                        sync_misses += 1
 
             # 其它 smart_* 事件
-            if smart is not None and isinstance(etype, str) and etype.startswith("smart_"):
-                try:
-                    smart.handle(list(event))
-                except Exception:
-                    pass
-                i += 1
-                continue
-
-            # 原有事件 + 滚轮事件
-            if etype == 'key_press':
-                key = event[1]
-                try:
-                    key_obj = getattr(Key, key)
-                except AttributeError:
-                    key_obj = key
-                keyboard_ctrl.press(key_obj)
-
-            elif etype == 'key_release':
-                key = event[1]
-                try:
-                    key_obj = getattr(Key, key)
-                except AttributeError:
-                    key_obj = key
-                keyboard_ctrl.release(key_obj)
-
-            elif etype == 'mouse_move':
-                x, y = event[1]
-                mouse_ctrl.position = (x, y)
-
-            elif etype == 'mouse_press':
-                button = getattr(Button, event[1])
-                x, y = event[2]
-                mouse_ctrl.position = (x, y)
-                mouse_ctrl.press(button)
-
-            elif etype == 'mouse_release':
-                button = getattr(Button, event[1])
-                x, y = event[2]
-                mouse_ctrl.position = (x, y)
-                mouse_ctrl.release(button)
-
-            elif etype == 'mouse_scroll':
-                dx, dy = event[1]
-                x, y = event[2]
-                mouse_ctrl.position = (x, y)
-                try:
-                    mouse_ctrl.scroll(int(dx), int(dy))
-                except Exception:
-                    mouse_ctrl.scroll(0, int(dy))
+            elif op == OP_SMART:
+                if smart is not None:
+                    try:
+                        smart.handle(args[i])
+                    except Exception:
+                        pass
+                    # 智能动作可能阻塞较久（等待文本等），之后重新锚定时间轴
+                    clock.rebase(current_timestamp)
 
             i += 1
 
+        self.last_playback_stats = clock.stats()
+        self.last_playback_stats["gap_saved"] = (limiter.saved / clock.speed) if limiter is not None else 0.0
+        self.last_playback_stats["sync_hits"] = sync_hits
+        self.last_playback_stats["sync_misses"] = sync_misses
+        if smart is not None:
+            self.last_playback_stats["hit_memory"] = smart.stats()
         self.is_playing = False
 
     def stop_playback(self) -> None:
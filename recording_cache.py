@@ -0,0 +1,145 @@
+import os
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from event_store import EventStore, MappedEventStore
+
+# 单个事件（原始 list + 编译计划中的条目）的粗略内存占用估算（字节），用于非 EventStore 的事件序列
+_EVENT_COST = 320
+# 内存映射录制的列数据位于页缓存，回放时只有访问过的页常驻：按列字节数的 1/_MAPPED_SHARE 计入预算
+_MAPPED_SHARE = 8
+
+
+def _deep_size(obj: Any) -> int:
+    """JSON 形状对象（dict/list/str/数值）的近似内存占用"""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_size(k) + _deep_size(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(_deep_size(v) for v in obj)
+    return size
+
+
+def _columns_bytes(ops, *cols) -> int:
+    return sum(col.itemsize * len(col) for col in (ops,) + cols)
+
+
+def _plan_bytes(plan: Any, own_columns: bool = False) -> int:
+    """
+    编译计划自身的占用：跳转表/参数表/键与按钮表，以及 WHILE 子计划（含其独立的列数组）。
+    顶层计划的列与事件存储共享、smart 事件参数与旁表共用同一对象，这里不重复计入。
+    """
+    size = sum(sys.getsizeof(t) for t in (plan.args, plan.if_jumps, plan.if_depth, plan.keys, plan.buttons))
+    if own_columns:
+        size += _columns_bytes(plan.ops, plan.times, plan.xs, plan.ys, plan.a, plan.b)
+    for arg in plan.args.values():
+        if isinstance(arg, tuple) and len(arg) == 2 and hasattr(arg[1], "if_jumps"):
+            size += _plan_bytes(arg[1], own_columns=True)
+        elif isinstance(arg, dict):
+            # IF 守护的负载副本
+            size += _deep_size(arg)
+    return size
+
+
+def estimate_bytes(events: Any, plan: Any = None) -> int:
+    """估算一份已解析录制（事件 + 编译计划）的内存占用"""
+    if isinstance(events, EventStore):
+        size = _columns_bytes(events.op, events.t, events.x, events.y, events.a, events.b)
+        if isinstance(events, MappedEventStore):
+            size //= _MAPPED_SHARE
+        size += _deep_size(events.payloads) + _deep_size(events.payload_pos)
+        size += _deep_size(events.keys) + _deep_size(events.buttons)
+    else:
+        size = len(events) * _EVENT_COST
+    if plan is not None:
+        size += _plan_bytes(plan)
+    return size
+
+
+class RecordingCache:
+    """
+    已解析、已编译录制的 LRU 缓存：
+      - 键为文件绝对路径，条目附带 (mtime_ns, size) 签名，文件变化后自动失效
+      - 按估算内存预算（max_bytes）与条目数（max_entries）淘汰最久未使用的录制
+    线程安全：UI 线程与任务线程可同时访问。
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, max_entries: int = 64):
+        self.max_bytes = int(max_bytes)
+        self.max_entries = int(max_entries)
+        self._entries: "OrderedDict[str, Tuple[Tuple[int, int], Any, Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _signature(path: str) -> Tuple[int, int]:
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def get(self, path: str) -> Optional[Tuple[Any, Any]]:
+        """返回 (events, plan)；未命中或文件已变化时返回 None"""
+        key = os.path.abspath(path)
+        try:
+            sig = self._signature(key)
+        except OSError:
+            sig = None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != sig:
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, path: str, events: Any, plan: Any) -> None:
+        key = os.path.abspath(path)
+        try:
+            sig = self._signature(key)
+        except OSError:
+            return
+        size = estimate_bytes(events, plan)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            if size > self.max_bytes:
+                # 单个录制超过预算：不缓存
+                return
+            self._entries[key] = (sig, events, plan, size)
+            self.current_bytes += size
+            while self._entries and (self.current_bytes > self.max_bytes or len(self._entries) > self.max_entries):
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def invalidate(self, path: str) -> None:
+        key = os.path.abspath(path)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self.current_bytes -= entry[3]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,266 @@
+import json
+import lzma
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from itertools import accumulate
+from typing import Any, Iterator, List, Optional, Tuple
+
+from event_store import EventStore, MappedEventStore
+
+# numpy（可选）：用于快速差分编码/解码，缺失时退回纯 Python
+try:
+    import numpy as np  # type: ignore
+except Exception:
+    np = None
+
+# 二进制录制格式（小端）：
+#   header  <8sHBBQII  magic, version, codec, flags, count, meta_len, body_len
+#   meta    UTF-8 JSON：keys / buttons / payloads / payload_pos
+#   padding 补齐到 8 字节边界
+#   body    列数据（按 codec 整块压缩）：t, x, y, a, b, op
+#             - 无差分：t 为 float64 秒，x/y/a/b 为 int32，op 为 uint8
+#             - 差分（FLAG_DELTA）：t 为 int64 纳秒增量，x/y 为 int32 增量
+
+MAGIC = b"\x89MREC\r\n\x1a"
+VERSION = 1
+_HEADER = struct.Struct("<8sHBBQII")
+
+CODEC_NONE = 0
+CODEC_ZLIB = 1
+CODEC_LZMA = 2
+_CODECS = {"none": CODEC_NONE, "zlib": CODEC_ZLIB, "lzma": CODEC_LZMA}
+
+FLAG_DELTA = 1
+
+_BIG_ENDIAN = sys.byteorder == "big"
+
+
+def is_binary_recording(filename: str) -> bool:
+    """按魔数判断文件是否为二进制录制"""
+    with open(filename, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def _le_bytes(arr: array) -> bytes:
+    if _BIG_ENDIAN and arr.itemsize > 1:
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def _from_le(typecode: str, data) -> array:
+    arr = array(typecode)
+    arr.frombytes(data)
+    if _BIG_ENDIAN and arr.itemsize > 1:
+        arr.byteswap()
+    return arr
+
+
+def _pad(n: int) -> int:
+    return (-n) % 8
+
+
+# —— 差分编码 ——
+def _encode_times(t: array) -> array:
+    """float64 秒 -> int64 纳秒增量"""
+    if np is not None:
+        ns = np.rint(np.frombuffer(t, dtype=np.float64) * 1e9).astype(np.int64)
+        return array("q", np.diff(ns, prepend=np.int64(0)).tobytes())
+    out = array("q")
+    prev = 0
+    for v in t:
+        ns = round(v * 1e9)
+        out.append(ns - prev)
+        prev = ns
+    return out
+
+
+def _decode_times(d: array) -> array:
+    if np is not None:
+        ns = np.cumsum(np.frombuffer(d, dtype=np.int64))
+        return array("d", (ns / 1e9).tobytes())
+    return array("d", [v / 1e9 for v in accumulate(d)])
+
+
+def _encode_deltas(col: array) -> array:
+    if np is not None:
+        return array("i", np.diff(np.frombuffer(col, dtype=np.int32), prepend=np.int32(0)).astype(np.int32).tobytes())
+    out = array("i")
+    prev = 0
+    for v in col:
+        out.append(v - prev)
+        prev = v
+    return out
+
+
+def _decode_deltas(d: array) -> array:
+    if np is not None:
+        return array("i", np.cumsum(np.frombuffer(d, dtype=np.int32), dtype=np.int32).tobytes())
+    return array("i", accumulate(d))
+
+
+def _split_body(body, count: int, delta: bool) -> Tuple[array, ...]:
+    """body -> (op, t, x, y, a, b)"""
+    sizes = (8, 4, 4, 4, 4, 1)
+    codes = ("q" if delta else "d", "i", "i", "i", "i", "B")
+    cols = []
+    off = 0
+    for size, code in zip(sizes, codes):
+        end = off + size * count
+        cols.append(_from_le(code, body[off:end]))
+        off = end
+    t, x, y, a, b, op = cols
+    if delta:
+        t = _decode_times(t)
+        x = _decode_deltas(x)
+        y = _decode_deltas(y)
+    return op, t, x, y, a, b
+
+
+def write_recording(filename: str, store: EventStore, compression: str = "zlib") -> None:
+    """
+    以二进制格式写出录制。
+    compression: "zlib" / "lzma" / "none"；压缩时对时间戳与坐标做差分编码以提高压缩率，
+    不压缩时保持原始列布局（可被内存映射直接读取）。
+    """
+    codec = _CODECS[compression]
+    delta = codec != CODEC_NONE
+    meta = json.dumps({
+        "keys": store.keys,
+        "buttons": store.buttons,
+        "payloads": store.payloads,
+        "payload_pos": store.payload_pos,
+    }, ensure_ascii=False).encode("utf-8")
+
+    if delta:
+        cols = (_encode_times(store.t), _encode_deltas(store.x), _encode_deltas(store.y), store.a, store.b, store.op)
+    else:
+        cols = (store.t, store.x, store.y, store.a, store.b, store.op)
+    body = b"".join(_le_bytes(c) for c in cols)
+    if codec == CODEC_ZLIB:
+        body = zlib.compress(body, 6)
+    elif codec == CODEC_LZMA:
+        body = lzma.compress(body)
+
+    header = _HEADER.pack(MAGIC, VERSION, codec, FLAG_DELTA if delta else 0, len(store), len(meta), len(body))
+    # 先写临时文件再替换：已映射该文件的读者继续看到旧内容，不会因截断而访问越界
+    tmp = filename + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(header)
+        f.write(meta)
+        f.write(b"\0" * _pad(len(header) + len(meta)))
+        f.write(body)
+    os.replace(tmp, filename)
+
+
+def read_header(data) -> Tuple[int, int, int, int, int, int, int]:
+    """返回 (codec, flags, count, meta_offset, meta_len, body_offset, body_len)"""
+    magic, version, codec, flags, count, meta_len, body_len = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError("不是二进制录制文件")
+    if version > VERSION:
+        raise ValueError(f"不支持的录制格式版本: {version}")
+    meta_off = _HEADER.size
+    body_off = meta_off + meta_len + _pad(meta_off + meta_len)
+    return codec, flags, count, meta_off, meta_len, body_off, body_len
+
+
+def read_recording(filename: str) -> EventStore:
+    with open(filename, "rb") as f:
+        data = f.read()
+    codec, flags, count, meta_off, meta_len, body_off, body_len = read_header(data)
+    meta = json.loads(bytes(data[meta_off:meta_off + meta_len]).decode("utf-8"))
+    body = memoryview(data)[body_off:body_off + body_len]
+    if codec == CODEC_ZLIB:
+        body = zlib.decompress(body)
+    elif codec == CODEC_LZMA:
+        body = lzma.decompress(body)
+    op, t, x, y, a, b = _split_body(body, count, bool(flags & FLAG_DELTA))
+    return EventStore.from_columns(op, t, x, y, a, b,
+                                   meta["keys"], meta["buttons"], meta["payloads"], meta["payload_pos"])
+
+
+def map_recording(filename: str) -> Optional[MappedEventStore]:
+    """
+    以内存映射方式打开录制，按下标/时间戳随机访问，不复制文件内容。
+    仅适用于未压缩、无差分的二进制录制（compression="none"）；其它格式返回 None。
+    """
+    if _BIG_ENDIAN:
+        return None
+    with open(filename, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            return None
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    codec, flags, count, meta_off, meta_len, body_off, body_len = read_header(mm)
+    if codec != CODEC_NONE or flags & FLAG_DELTA:
+        mm.close()
+        return None
+    meta = json.loads(mm[meta_off:meta_off + meta_len].decode("utf-8"))
+
+    view = memoryview(mm)
+    cols = []
+    off = body_off
+    for size, code in ((8, "d"), (4, "i"), (4, "i"), (4, "i"), (4, "i"), (1, "B")):
+        end = off + size * count
+        cols.append(view[off:end].cast(code))
+        off = end
+    t, x, y, a, b, op = cols
+    store = MappedEventStore.from_columns(op, t, x, y, a, b,
+                                          meta["keys"], meta["buttons"], meta["payloads"], meta["payload_pos"])
+    store.filename = filename
+    store._mm = mm
+    return store
+
+
+_WS = " \t\r\n"
+
+
+def iter_json_batches(filename: str, batch_size: int = 1024, chunk_size: int = 1 << 20) -> Iterator[List[Any]]:
+    """
+    增量解析 JSON 数组录制，按批产出事件（每批最多 batch_size 个），
+    无需等待整个文件解析完成即可开始消费。
+    """
+    decoder = json.JSONDecoder()
+    batch: List[Any] = []
+    with open(filename, "r") as f:
+        buf = f.read(chunk_size)
+        eof = not buf
+        while not eof and not buf.strip(_WS):
+            more = f.read(chunk_size)
+            eof = not more
+            buf += more
+        pos = len(buf) - len(buf.lstrip(_WS))
+        if buf[pos:pos + 1] != "[":
+            raise ValueError("录制文件不是 JSON 数组")
+        pos += 1
+        while True:
+            # 跳过空白与分隔逗号
+            while pos < len(buf) and buf[pos] in _WS + ",":
+                pos += 1
+            if pos < len(buf) and buf[pos] == "]":
+                break
+            try:
+                ev, end = decoder.raw_decode(buf, pos)
+                # 值恰好结束在缓冲区末尾时（如被截断的数字）需要更多数据才能确认
+                complete = end < len(buf) or eof
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                complete = False
+            if complete:
+                batch.append(ev)
+                pos = end
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+                continue
+            more = f.read(chunk_size)
+            eof = not more
+            buf = buf[pos:] + more
+            pos = 0
+    if batch:
+        yield batch
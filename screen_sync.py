@@ -0,0 +1,181 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+from pynput.mouse import Controller as MouseController
+
+# 截屏依赖（可选）：缺失时不录制指纹，回放时同步事件退化为按录制延迟等待
+try:
+    import mss  # type: ignore
+    import numpy as np  # type: ignore
+except Exception:
+    mss = None
+    np = None
+
+Region = Tuple[int, int, int, int]  # left, top, width, height
+
+# 指纹区域边长（像素，以点击位置为中心）与缩略图边长
+REGION_SIZE = 64
+THUMB_SIZE = 16
+# 判定匹配的平均灰度差（0~255）
+DEFAULT_TOLERANCE = 4.0
+
+_local = threading.local()
+
+
+def available() -> bool:
+    return mss is not None and np is not None
+
+
+def _sct():
+    # mss 实例不能跨线程使用：每个线程各持有一个
+    sct = getattr(_local, "sct", None)
+    if sct is None:
+        sct = _local.sct = mss.mss()
+    return sct
+
+
+def region_around(x: int, y: int, size: int = REGION_SIZE) -> Region:
+    """以 (x, y) 为中心、限制在虚拟屏幕范围内的正方形区域"""
+    virtual = _sct().monitors[0]
+    left = min(max(x - size // 2, virtual["left"]), virtual["left"] + virtual["width"] - size)
+    top = min(max(y - size // 2, virtual["top"]), virtual["top"] + virtual["height"] - size)
+    return (int(left), int(top), size, size)
+
+
+def fingerprint(region: Region, thumb: int = THUMB_SIZE) -> Optional[bytes]:
+    """截取区域并缩小为 thumb×thumb 灰度缩略图（按块取均值），返回其字节串"""
+    l, t, w, h = region
+    img = np.asarray(_sct().grab({"left": l, "top": t, "width": w, "height": h}))
+    bh, bw = h // thumb, w // thumb
+    if bh == 0 or bw == 0:
+        return None
+    bgr = img[:bh * thumb, :bw * thumb, :3].astype(np.float32)
+    gray = bgr[:, :, 0] * 0.114 + bgr[:, :, 1] * 0.587 + bgr[:, :, 2] * 0.299
+    small = gray.reshape(thumb, bh, thumb, bw).mean(axis=(1, 3))
+    return small.astype(np.uint8).tobytes()
+
+
+def distance(a: bytes, b: bytes) -> float:
+    """两个指纹的平均灰度差；尺寸不同视为不匹配"""
+    if len(a) != len(b):
+        return 255.0
+    return float(np.abs(np.frombuffer(a, np.uint8).astype(np.int16) - np.frombuffer(b, np.uint8)).mean())
+
+
+class ScreenSampler:
+    """
+    录制时的屏幕采样线程：每隔 interval 秒截取鼠标周围区域的指纹，保留最近一小段历史。
+    点击事件的指纹取自点击之前的最后一次采样，反映“可以点击”时的画面，
+    而不是按下后控件已变化的画面；采样在独立线程进行，不占用输入回调。
+    """
+
+    def __init__(self, start_ns: int, interval: float = 0.05, size: int = REGION_SIZE, history: int = 64):
+        self.start_ns = start_ns
+        self.interval = interval
+        self.size = size
+        self._mouse = MouseController()
+        self._samples: Deque[Tuple[float, int, int, Region, bytes]] = deque(maxlen=history)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                x, y = self._mouse.position
+                region = region_around(int(x), int(y), self.size)
+                fp = fingerprint(region)
+            except Exception:
+                continue
+            if fp is not None:
+                t = (time.perf_counter_ns() - self.start_ns) / 1e9
+                self._samples.append((t, int(x), int(y), region, fp))
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def sample_before(self, t: float, x: int, y: int, not_before: float) -> Optional[Tuple[Region, bytes]]:
+        """点击 (x, y, t) 之前、not_before 之后的最后一次采样，且点击位于区域中央附近"""
+        max_offset = self.size // 4
+        for st, sx, sy, region, fp in reversed(list(self._samples)):
+            if st > t:
+                continue
+            if st < not_before:
+                return None
+            if abs(sx - x) <= max_offset and abs(sy - y) <= max_offset:
+                return region, fp
+            return None
+        return None
+
+
+class ScreenSyncStage:
+    """
+    录制管线中的一级：在间隔不短于 min_delay 的鼠标按下事件之前插入 smart_screen_sync 事件，
+    时间戳为上一个事件的时间，timeout 为录制的等待时长。
+    """
+
+    def __init__(self, sink: Callable[[Any], None], sampler: ScreenSampler, min_delay: float = 0.2):
+        self.sink = sink
+        self.sampler = sampler
+        self.min_delay = float(min_delay)
+        self.prev_t = 0.0
+        self.inserted = 0
+
+    def __call__(self, ev: Any) -> None:
+        t = ev[-1]
+        if ev[0] == "mouse_press" and t - self.prev_t >= self.min_delay:
+            x, y = ev[2]
+            hit = self.sampler.sample_before(t, x, y, self.prev_t)
+            if hit is not None:
+                region, fp = hit
+                self.sink(("smart_screen_sync", {
+                    "region": list(region),
+                    "fingerprint": fp.hex(),
+                    "timeout": t - self.prev_t,
+                }, self.prev_t))
+                self.inserted += 1
+        self.prev_t = t
+        self.sink(ev)
+
+
+def parse_payload(payload: Any) -> Optional[Dict[str, Any]]:
+    """smart_screen_sync 负载 -> 回放参数；格式不对时返回 None（回放按录制延迟等待）"""
+    if not isinstance(payload, dict):
+        return None
+    try:
+        l, t, w, h = (int(v) for v in payload["region"])
+        return {
+            "region": (l, t, w, h),
+            "fingerprint": bytes.fromhex(payload["fingerprint"]),
+            "timeout": max(float(payload.get("timeout", 0.0)), 0.0),
+            "tolerance": float(payload.get("tolerance", DEFAULT_TOLERANCE)),
+        }
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def wait_for_match(args: Dict[str, Any], deadline: float, should_stop: Optional[Callable[[], bool]] = None,
+                   interval: float = 0.02) -> bool:
+    """
+    轮询区域指纹，直到与录制时一致（返回 True）或到达 deadline（perf_counter 时刻，返回 False）。
+    """
+    if not available():
+        return False
+    region, expected, tolerance = args["region"], args["fingerprint"], args["tolerance"]
+    while True:
+        try:
+            fp = fingerprint(region)
+        except Exception:
+            return False
+        if fp is not None and distance(fp, expected) <= tolerance:
+            return True
+        remain = deadline - time.perf_counter()
+        if remain <= 0 or (should_stop is not None and should_stop()):
+            return False
+        time.sleep(min(interval, remain))
@@ -1,14 +1,158 @@
+import threading
 import time
-from typing import Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 import cv2
 import numpy as np
 from .screen import grab, move_click, to_screen, scroll as wheel, key_press
-from .ocr_utils import find_keywords
-from .template_detector import click_template
+from .ocr_utils import find_keywords, locate_keywords, locate_keywords_many
+from .template_detector import match_templates
 
 Region = Tuple[int, int, int, int]
 
+# 命中位置记忆：先在上次命中点周围外扩 MEMORY_MARGIN 像素的小窗口内验证
+MEMORY_MARGIN = 32
+
+def _is_green_patch(img_bgr: np.ndarray, hit: Dict, region: Optional[Region]) -> bool:
+    """命中文字中心附近是否为绿色（按钮可用等状态），img_bgr 为 OCR 所用的同一帧"""
+    cx, cy = hit["center"]
+    if region:
+        l, t, _, _ = region
+        cx, cy = cx - l, cy - t
+    h, w = img_bgr.shape[:2]
+    x1, y1 = max(0, cx - 8), max(0, cy - 8)
+    x2, y2 = min(w, cx + 8), min(h, cy + 8)
+    patch = img_bgr[y1:y2, x1:x2]
+    if patch.size == 0:
+        return False
+    hsv = cv2.cvtColor(patch, cv2.COLOR_BGR2HSV)
+    H, S, V = hsv[:, :, 0], hsv[:, :, 1], hsv[:, :, 2]
+    mask = (H >= 35) & (H <= 85) & (S >= 60) & (V >= 80)
+    return (mask.sum() / mask.size) > 0.4
+
+def _bbox_size(bbox) -> Tuple[int, int]:
+    xs = [p[0] for p in bbox]
+    ys = [p[1] for p in bbox]
+    return int(max(xs) - min(xs)), int(max(ys) - min(ys))
+
+def _window_around(center: Tuple[int, int], size: Tuple[int, int], region: Optional[Region],
+                   margin: int = MEMORY_MARGIN) -> Optional[Region]:
+    """以 center 为中心、size 外扩 margin 的屏幕窗口；限制在 region 内，无交集时返回 None"""
+    (cx, cy), (w, h) = center, size
+    l, t = cx - w // 2 - margin, cy - h // 2 - margin
+    r, b = cx + (w + 1) // 2 + margin, cy + (h + 1) // 2 + margin
+    if region:
+        rl, rt, rw, rh = region
+        l, t, r, b = max(l, rl), max(t, rt), min(r, rl + rw), min(b, rt + rh)
+    if r <= l or b <= t:
+        return None
+    return (int(l), int(t), int(r - l), int(b - t))
+
+def _memory_key(kind: str, target, region: Optional[Region], *extra) -> tuple:
+    return (kind, target, tuple(region) if region else None) + extra
+
 class SmartActions:
+    """
+    智能动作。循环任务中按钮通常停在上一轮的位置：find_and_click_text / click_by_template /
+    click_any_template 记住各自（按关键词/模板与区域区分）的上次命中位置，
+    下次先在其周围的小窗口内验证，未命中再回退到整个区域搜索。小窗口未命中即丢弃该记忆，
+    之后的轮询（以及之后的调用）直接搜索整个区域，直到再次命中重新记住位置，
+    避免目标不在时每次轮询都多识别一遍小窗口。命中率见 memory_stats()。
+    """
+
+    def __init__(self):
+        self._last_hits: Dict[tuple, Tuple[Tuple[int, int], Tuple[int, int]]] = {}
+        self._memory_counts: Dict[str, Dict[str, int]] = {}
+        self._memory_lock = threading.Lock()
+
+    # —— 命中位置记忆 ——
+    def _recall_window(self, key: tuple, region: Optional[Region]) -> Optional[Region]:
+        with self._memory_lock:
+            last = self._last_hits.get(key)
+        return _window_around(*last, region) if last else None
+
+    def _forget(self, key: tuple):
+        with self._memory_lock:
+            self._last_hits.pop(key, None)
+
+    def _remember(self, key: tuple, center: Tuple[int, int], size: Tuple[int, int]):
+        with self._memory_lock:
+            self._last_hits[key] = ((int(center[0]), int(center[1])), (int(size[0]), int(size[1])))
+
+    def _count(self, action: str, outcome: str):
+        with self._memory_lock:
+            counts = self._memory_counts.setdefault(action, {"hits": 0, "misses": 0, "cold": 0})
+            counts[outcome] += 1
+
+    def memory_stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        各动作的位置记忆统计：hits 小窗口验证命中，misses 验证未命中（丢弃记忆并回退全区域），
+        cold 无记忆直接全区域搜索；hit_rate = hits / (hits + misses)
+        """
+        with self._memory_lock:
+            out = {}
+            for action, counts in self._memory_counts.items():
+                tried = counts["hits"] + counts["misses"]
+                out[action] = dict(counts, hit_rate=(counts["hits"] / tried) if tried else 0.0)
+            return out
+
+    def forget_hits(self):
+        """清空命中位置记忆与统计"""
+        with self._memory_lock:
+            self._last_hits.clear()
+            self._memory_counts.clear()
+
+    def _find_text_remembered(self, keywords: List[str], region: Optional[Region],
+                              prefer_area: str) -> Optional[Dict]:
+        key = _memory_key("text", tuple(keywords), region, prefer_area)
+        window = self._recall_window(key, region)
+        if window is not None:
+            try:
+                hit = find_keywords(keywords, region=window, prefer_area=prefer_area)
+            except Exception:
+                hit = None
+            if hit:
+                self._count("find_and_click_text", "hits")
+                self._remember(key, hit["center"], _bbox_size(hit["bbox"]))
+                return hit
+            self._count("find_and_click_text", "misses")
+            self._forget(key)
+        else:
+            self._count("find_and_click_text", "cold")
+        hit = find_keywords(keywords, region=region, prefer_area=prefer_area)
+        if hit:
+            self._remember(key, hit["center"], _bbox_size(hit["bbox"]))
+        return hit
+
+    def _click_templates_remembered(self, action: str, template_paths: Sequence[str],
+                                    region: Optional[Region], threshold: float) -> Optional[Dict]:
+        """截屏匹配多个模板并点击得分最高的命中（中心为屏幕坐标）；先验证上次命中附近的小窗口"""
+        key = _memory_key("template", tuple(template_paths), region)
+        window = self._recall_window(key, region)
+        hit = None
+        if window is not None:
+            try:
+                # 小窗口直接逐尺度全搜索，无需粗到精
+                hits = match_templates(template_paths, grab(window), threshold=threshold, search="exhaustive")
+            except Exception:
+                hits = []
+            if hits:
+                hit, origin = hits[0], window
+            self._count(action, "hits" if hit else "misses")
+            if hit is None:
+                self._forget(key)
+        else:
+            self._count(action, "cold")
+        if hit is None:
+            hits = match_templates(template_paths, grab(region), threshold=threshold)
+            if not hits:
+                return None
+            hit, origin = hits[0], region
+        sx, sy = to_screen(hit["center"], origin)
+        hit["center"] = (sx, sy)
+        self._remember(key, (sx, sy), hit["wh"])
+        move_click(sx, sy)
+        return hit
+
     def find_and_click_text(
         self,
         keywords: List[str],
@@ -19,7 +163,7 @@ class SmartActions:
     ) -> bool:
         end = time.time() + timeout
         while time.time() < end:
-            hit = find_keywords(keywords, region=region, prefer_area=prefer_area)
+            hit = self._find_text_remembered(keywords, region, prefer_area)
             if hit:
                 x, y = hit["center"]
                 move_click(x, y)
@@ -35,30 +179,12 @@ class SmartActions:
         interval: float = 0.8,
         require_green: bool = False,
     ) -> bool:
-        def is_green_patch(img_bgr: np.ndarray, cx: int, cy: int) -> bool:
-            h, w = img_bgr.shape[:2]
-            x1, y1 = max(0, cx - 8), max(0, cy - 8)
-            x2, y2 = min(w, cx + 8), min(h, cy + 8)
-            patch = img_bgr[y1:y2, x1:x2]
-            if patch.size == 0:
-                return False
-            hsv = cv2.cvtColor(patch, cv2.COLOR_BGR2HSV)
-            H, S, V = hsv[:, :, 0], hsv[:, :, 1], hsv[:, :, 2]
-            mask = (H >= 35) & (H <= 85) & (S >= 60) & (V >= 80)
-            return (mask.sum() / mask.size) > 0.4
-
         end = time.time() + timeout
         while time.time() < end:
-            img = grab(region)
-            hit = find_keywords(keywords, region=region, prefer_area="bottom-right")
+            # 每轮只截屏一次：OCR 与颜色判断使用同一帧
+            hit, img = locate_keywords(keywords, region=region, prefer_area="bottom-right")
             if hit:
-                if not require_green:
-                    return True
-                cx, cy = hit["center"]
-                if region:
-                    l, t, _, _ = region
-                    cx, cy = cx - l, cy - t
-                if is_green_patch(img, cx, cy):
+                if not require_green or _is_green_patch(img, hit, region):
                     return True
             time.sleep(interval)
         return False
@@ -94,7 +220,15 @@ class SmartActions:
         region: Optional[Region] = None,
         threshold: float = 0.84,
     ) -> bool:
-        return click_template(template_path, region=region, threshold=threshold)
+        return self._click_templates_remembered("click_by_template", [template_path], region, threshold) is not None
+
+    def click_any_template(
+        self,
+        template_paths: List[str],
+        region: Optional[Region] = None,
+        threshold: float = 0.84,
+    ) -> bool:
+        return self._click_templates_remembered("click_any_template", template_paths, region, threshold) is not None
 
     def ensure_muted(self, strategy: str = "press_m"):
         if strategy == "press_m":
@@ -110,24 +244,26 @@ class SmartActions:
         prefer_area: str = "bottom-right",
         require_green: bool = False,
     ) -> bool:
-        hit = find_keywords(keywords, region=region, prefer_area=prefer_area)
+        hit, img = locate_keywords(keywords, region=region, prefer_area=prefer_area)
         if not hit:
             return False
         if not require_green:
             return True
-        # 颜色判断（可选）
-        img = grab(region)
-        cx, cy = hit["center"]
-        if region:
-            l, t, _, _ = region
-            cx, cy = cx - l, cy - t
-        h, w = img.shape[:2]
-        x1, y1 = max(0, cx - 8), max(0, cy - 8)
-        x2, y2 = min(w, cx + 8), min(h, cy + 8)
-        patch = img[y1:y2, x1:x2]
-        if patch.size == 0:
-            return False
-        hsv = cv2.cvtColor(patch, cv2.COLOR_BGR2HSV)
-        H, S, V = hsv[:, :, 0], hsv[:, :, 1], hsv[:, :, 2]
-        mask = (H >= 35) & (H <= 85) & (S >= 60) & (V >= 80)
-        return (mask.sum() / mask.size) > 0.4
\ No newline at end of file
+        # 颜色判断（可选）：与 OCR 使用同一帧
+        return _is_green_patch(img, hit, region)
+
+    def texts_present(self, conditions: List[Dict]) -> List[bool]:
+        """
+        同时判断多个条件（嵌套 IF 守护、WHILE 条件与外层守护）：识别合为一次请求。
+        conditions: [{keywords, region, prefer_area, require_green}, ...]，与 is_text_present 参数相同
+        """
+        queries = [(c.get("keywords", []), c.get("region"), c.get("prefer_area", "bottom-right")) for c in conditions]
+        out = []
+        for c, (hit, img) in zip(conditions, locate_keywords_many(queries)):
+            if not hit:
+                out.append(False)
+            elif not c.get("require_green"):
+                out.append(True)
+            else:
+                out.append(_is_green_patch(img, hit, c.get("region")))
+        return out
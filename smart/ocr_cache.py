@@ -0,0 +1,105 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+
+def _normalize(results) -> List[tuple]:
+    """OCR 结果转为纯 Python 类型（numpy 数值 -> int/float），便于缓存与序列化"""
+    out = []
+    for bbox, text, conf in results:
+        out.append(([[int(p[0]), int(p[1])] for p in bbox], str(text), float(conf)))
+    return out
+
+
+class OcrCache:
+    """
+    按内容寻址的 OCR 结果缓存：键为像素摘要 + 引擎/语言配置（见 ocr_utils.cache_key）。
+      - 内存层：有界 LRU（max_entries 条）
+      - 磁盘层（可选，disk_dir 非空）：每条结果一个 JSON 文件，跨进程重启保留；命中后回填内存层
+    线程安全：回放线程与各智能动作可同时访问。
+    """
+
+    def __init__(self, max_entries: int = 256, disk_dir: Optional[str] = None):
+        self.max_entries = max(int(max_entries), 1)
+        self.disk_dir = disk_dir
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+        self._entries: "OrderedDict[str, List[tuple]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], key + ".json")
+
+    def get(self, key: str) -> Optional[List[tuple]]:
+        with self._lock:
+            results = self._entries.get(key)
+            if results is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return results
+        if self.disk_dir:
+            try:
+                with open(self._path(key), "r", encoding="utf-8") as f:
+                    results = [(bbox, text, conf) for bbox, text, conf in json.load(f)]
+            except (OSError, ValueError, TypeError):
+                results = None
+            if results is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                    self._remember(key, results)
+                return results
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, results) -> List[tuple]:
+        """写入缓存，返回规范化后的结果"""
+        results = _normalize(results)
+        with self._lock:
+            self._remember(key, results)
+        if self.disk_dir:
+            path = self._path(key)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp = path + ".tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(results, f, ensure_ascii=False)
+                os.replace(tmp, path)
+            except OSError:
+                pass
+        return results
+
+    def _remember(self, key: str, results: List[tuple]) -> None:
+        self._entries[key] = results
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self, disk: bool = False) -> None:
+        """清空内存层（disk=True 时同时删除磁盘层文件）"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.disk_hits = self.misses = 0
+        if disk and self.disk_dir:
+            for root, _, files in os.walk(self.disk_dir):
+                for name in files:
+                    if name.endswith(".json"):
+                        try:
+                            os.remove(os.path.join(root, name))
+                        except OSError:
+                            pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "disk": bool(self.disk_dir),
+            }
@@ -0,0 +1,118 @@
+import multiprocessing
+import os
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Any, List, Optional, Sequence
+import numpy as np
+
+from . import ocr_utils
+from .ocr_cache import _normalize
+
+
+# —— 工作进程端 ——
+def _init_worker(langs, gpu):
+    # 每个工作进程启动时加载一次引擎，之后的识别请求没有初始化开销
+    ocr_utils._ensure_engine(langs, gpu)
+
+def _worker_engine_id() -> str:
+    return ocr_utils.engine_id()
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13：附加时会向资源跟踪器重复登记。工作进程与父进程共用同一个跟踪器（登记为集合，重复无害），
+        # 这里不能注销，否则父进程 unlink 时的注销会在跟踪器中报 KeyError
+        return shared_memory.SharedMemory(name=name)
+
+def _worker_ocr(name: str, shape, dtype: str):
+    shm = _attach(name)
+    try:
+        image = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        results = _normalize(ocr_utils._run_ocr(image))
+        del image
+    finally:
+        shm.close()
+    return results
+
+
+# —— 调用方 ——
+class OcrPool:
+    """
+    进程池 OCR 服务：识别在独立进程中进行，不占用回放线程的 GIL 与 CPU 时间片。
+    帧经共享内存传递（只复制一次像素，不 pickle numpy 数组），请求以 Future 形式返回，可设超时；
+    多个区域/守护条件经 recognize_many 分发到多个工作进程并行识别。
+    """
+
+    def __init__(self, workers: Optional[int] = None, langs=None, gpu: bool = False, timeout: float = 30.0):
+        if workers is None or workers <= 0:
+            workers = max(1, min(4, (os.cpu_count() or 2) // 2))
+        self.workers = workers
+        self.timeout = timeout
+        # 使用 spawn 而不是 Linux 默认的 fork：父进程此时已有多个线程（Qt、pynput 监听、持有 _init_lock 的预热线程），
+        # fork 出的子进程可能继承处于加锁状态的锁，在 _init_worker 中死锁
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker, initargs=(langs, gpu),
+        )
+        self._engine = self._executor.submit(_worker_engine_id)
+
+    def engine_id(self, timeout: Optional[float] = None) -> str:
+        """
+        工作进程使用的引擎及语言配置（首次调用时等待工作进程就绪，最多 timeout 秒，缺省为 self.timeout）；
+        超时抛出 concurrent.futures.TimeoutError（如工作进程加载引擎时卡住）
+        """
+        return self._engine.result(self.timeout if timeout is None else timeout)
+
+    def submit(self, image: np.ndarray) -> Future:
+        """提交一帧（BGR）识别，返回 Future，结果为 [(bbox, text, conf), ...]"""
+        image = np.ascontiguousarray(image)
+        shm = shared_memory.SharedMemory(create=True, size=max(image.nbytes, 1))
+        try:
+            view = np.ndarray(image.shape, dtype=image.dtype, buffer=shm.buf)
+            view[...] = image
+            del view
+            future = self._executor.submit(_worker_ocr, shm.name, image.shape, image.dtype.str)
+        except Exception:
+            shm.close()
+            shm.unlink()
+            raise
+
+        def _release(_):
+            shm.close()
+            shm.unlink()
+
+        future.add_done_callback(_release)
+        return future
+
+    def recognize(self, image: np.ndarray, timeout: Optional[float] = None):
+        """同步识别；超时抛出 concurrent.futures.TimeoutError"""
+        return self.submit(image).result(self.timeout if timeout is None else timeout)
+
+    def submit_many(self, images: Sequence[np.ndarray]) -> List[Future]:
+        """提交多帧，各帧由空闲的工作进程并行识别"""
+        return [self.submit(img) for img in images]
+
+    def recognize_many(self, images: Sequence[np.ndarray], timeout: Optional[float] = None) -> List[Any]:
+        """
+        并行识别多帧，按输入顺序返回；超时未完成的一项为 None（并取消）。
+        进程池损坏（工作进程异常退出）时抛出 BrokenProcessPool，由调用方回退到本进程内识别。
+        """
+        futures = self.submit_many(images)
+        wait(futures, self.timeout if timeout is None else timeout)
+        out = []
+        for f in futures:
+            if not f.done():
+                f.cancel()
+                out.append(None)
+                continue
+            exc = f.exception()
+            if isinstance(exc, BrokenProcessPool):
+                raise exc
+            out.append(f.result() if exc is None else None)
+        return out
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
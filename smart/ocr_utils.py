@@ -1,19 +1,36 @@
+import hashlib
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
 from typing import List, Optional, Tuple, Dict, Any
 import numpy as np
 from rapidfuzz import process, fuzz
 from .screen import grab
+from .ocr_cache import OcrCache
 
 # 可选两种 OCR 引擎：优先 easyocr（若已安装 torch 等），否则回退到 Tesseract
 _USE_EASYOCR = False
 _EASYREADER = None
+_EASY_LANGS: List[str] = []
+_TESS_LANG = "chi_sim+eng"
+
+# 引擎初始化只进行一次：预热线程与首次 ocr() 调用共用同一把锁，后到者等待先到者完成
+_init_lock = threading.Lock()
+_engine_ready = threading.Event()
+_load_seconds: Optional[float] = None
+_warm_thread: Optional[threading.Thread] = None
+# 预热线程的启动登记单独加锁：_init_lock 在整个模型加载期间被持有，warm_up 不能去等它
+_warm_lock = threading.Lock()
 
 def _try_init_easyocr(langs=None, gpu=False):
-    global _USE_EASYOCR, _EASYREADER
+    global _USE_EASYOCR, _EASYREADER, _EASY_LANGS
     try:
         import easyocr  # type: ignore
         if langs is None:
             langs = ["ch_sim", "en"]
         _EASYREADER = easyocr.Reader(langs, gpu=gpu)
+        _EASY_LANGS = list(langs)
         _USE_EASYOCR = True
     except Exception:
         _USE_EASYOCR = False
@@ -23,13 +40,56 @@ def _ocr_easy(image: np.ndarray):
     # 返回 [(bbox, text, conf), ...]
     return _EASYREADER.readtext(image, detail=1, paragraph=False)
 
-def _ocr_tesseract(image: np.ndarray):
+# Tesseract 常驻引擎（可选 tesserocr）：引擎在进程内保持加载，不再每次调用都启动 tesseract 子进程、写临时文件。
+# 整个进程共用一个 TessBaseAPI（由预热加载，回放/任务线程直接复用）；它不是线程安全的，识别调用经 _tess_lock 串行。
+# 缺少 tesserocr 时回退到 pytesseract。
+_tess_api_shared = None
+_tess_lock = threading.Lock()
+_HAS_TESSEROCR: Optional[bool] = None
+
+def _tess_api():
+    global _HAS_TESSEROCR, _tess_api_shared
+    if _tess_api_shared is None and _HAS_TESSEROCR is not False:
+        with _tess_lock:
+            if _tess_api_shared is None and _HAS_TESSEROCR is not False:
+                try:
+                    import tesserocr  # type: ignore
+                    _tess_api_shared = tesserocr.PyTessBaseAPI(lang=_TESS_LANG)
+                    _HAS_TESSEROCR = True
+                except Exception:
+                    _HAS_TESSEROCR = False
+    return _tess_api_shared
+
+def _ocr_tesserocr(api, image: np.ndarray):
+    import cv2
+    from tesserocr import RIL, iterate_level  # type: ignore
+    rgb = np.ascontiguousarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+    h, w = rgb.shape[:2]
+    api.SetImageBytes(rgb.tobytes(), w, h, 3, w * 3)
+    api.Recognize()
+    results = []
+    it = api.GetIterator()
+    if it is None:
+        return results
+    for word in iterate_level(it, RIL.WORD):
+        txt = (word.GetUTF8Text(RIL.WORD) or "").strip()
+        if not txt:
+            continue
+        box = word.BoundingBox(RIL.WORD)
+        if not box:
+            continue
+        x1, y1, x2, y2 = box
+        bbox = [[x1, y1], [x2, y1], [x2, y2], [x1, y2]]
+        results.append((bbox, txt, word.Confidence(RIL.WORD) / 100.0))
+    return results
+
+def _ocr_pytesseract(image: np.ndarray):
     # 用 pytesseract 返回与 easyocr 近似的结构
     import cv2
     import pytesseract
     from pytesseract import Output
     rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    data = pytesseract.image_to_data(rgb, lang="chi_sim+eng", output_type=Output.DICT)
+    data = pytesseract.image_to_data(rgb, lang=_TESS_LANG, output_type=Output.DICT)
     n = len(data["text"])
     results = []
     for i in range(n):
@@ -46,26 +106,182 @@ def _ocr_tesseract(image: np.ndarray):
         results.append((bbox, txt, conf))
     return results
 
-def ocr(image: np.ndarray):
-    if _EASYREADER is None and not _USE_EASYOCR:
-        _try_init_easyocr()
+def _ocr_tesseract(image: np.ndarray):
+    api = _tess_api()
+    if api is not None:
+        with _tess_lock:
+            return _ocr_tesserocr(api, image)
+    return _ocr_pytesseract(image)
+
+def _ensure_engine(langs=None, gpu=False):
+    global _load_seconds
+    if _engine_ready.is_set():
+        return
+    with _init_lock:
+        if _engine_ready.is_set():
+            return
+        start = time.perf_counter()
+        _try_init_easyocr(langs, gpu)
+        if not _USE_EASYOCR and _tess_api() is None:
+            try:
+                import pytesseract
+                pytesseract.get_tesseract_version()
+            except Exception:
+                pass
+        _load_seconds = time.perf_counter() - start
+        _engine_ready.set()
+
+def warm_up(langs=None, gpu=False, workers: int = 0) -> Optional[threading.Thread]:
+    """
+    在后台线程加载 OCR 引擎（EasyOCR 模型加载可能需要数秒），应用或任务启动时调用；可重复调用。
+    预热完成前到达的智能事件会等待加载结束，之后的调用不再有初始化开销。
+    workers > 0 时改为启动进程池 OCR，由各工作进程各自加载引擎。
+    """
+    global _warm_thread
+    if workers > 0:
+        start_ocr_pool(workers, langs, gpu)
+        return None
+    with _warm_lock:
+        if _warm_thread is None:
+            _warm_thread = threading.Thread(target=_ensure_engine, args=(langs, gpu), daemon=True)
+            _warm_thread.start()
+        return _warm_thread
+
+def ocr_status() -> Dict[str, Any]:
+    """引擎就绪状态与加载耗时（秒）"""
+    ready = _engine_ready.is_set()
+    return {
+        "ready": ready,
+        "engine": engine_id() if ready else None,
+        "load_seconds": _load_seconds,
+    }
+
+def wait_until_ready(timeout: Optional[float] = None) -> bool:
+    return _engine_ready.wait(timeout)
+
+def engine_id() -> str:
+    """当前 OCR 引擎及语言配置（引擎未加载时先加载；预热进行中则等待其完成）"""
+    _ensure_engine()
+    if _USE_EASYOCR and _EASYREADER is not None:
+        return "easyocr:" + ",".join(_EASY_LANGS)
+    return "tesseract:" + _TESS_LANG
+
+def _run_ocr(image: np.ndarray):
     if _USE_EASYOCR and _EASYREADER is not None:
         return _ocr_easy(image)
     # 回退到 Tesseract
     return _ocr_tesseract(image)
 
-def find_keywords(
-    keywords: List[str],
-    region: Optional[Tuple[int, int, int, int]] = None,
-    min_conf: float = 0.5,
-    prefer_area: str = "bottom-right",
-    negative: Optional[List[str]] = None,
-) -> Optional[Dict[str, Any]]:
+def _run_ocr_batch(images: List[np.ndarray]) -> List[Any]:
     """
-    返回: {'center': (x,y) 屏幕坐标, 'text': str, 'conf': float, 'bbox': list}
+    一次请求识别多个区域：常驻 tesserocr 引擎在一次持锁内依次识别全部区域，
+    其它引擎（EasyOCR / pytesseract）逐个识别。
+    """
+    if _USE_EASYOCR and _EASYREADER is not None:
+        return [_ocr_easy(img) for img in images]
+    api = _tess_api()
+    if api is not None:
+        with _tess_lock:
+            return [_ocr_tesserocr(api, img) for img in images]
+    return [_ocr_pytesseract(img) for img in images]
+
+def cache_key(image: np.ndarray, engine: str) -> str:
+    """OCR 缓存键：像素内容（含尺寸与类型）+ 引擎/语言配置的摘要"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(engine.encode())
+    h.update(repr((image.shape, image.dtype.str)).encode())
+    h.update(np.ascontiguousarray(image).data)
+    return h.hexdigest()
+
+# 识别结果缓存：画面与识别过的某一帧逐像素相同时直接返回其结果。
+# 守护条件/等待文本在画面静止时只需一次哈希；循环任务回到同一画面时也不再重复识别。
+_cache = OcrCache()
+
+def configure_ocr_cache(max_entries: int = 256, disk_dir: Optional[str] = None):
+    """设置内存层容量与磁盘层目录（disk_dir 为空则只用内存）"""
+    global _cache
+    _cache = OcrCache(max_entries, disk_dir)
+
+# 进程池 OCR（可选，见 ocr_pool.OcrPool）：启动后 ocr() 交给工作进程识别
+_pool = None
+_pool_lock = threading.Lock()
+
+def start_ocr_pool(workers: Optional[int] = None, langs=None, gpu: bool = False, timeout: float = 30.0):
+    """启动进程池 OCR 服务（已启动时直接返回）；workers 为空时按 CPU 核数选择"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            from .ocr_pool import OcrPool
+            _pool = OcrPool(workers, langs, gpu, timeout)
+        return _pool
+
+def stop_ocr_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
+
+def _drop_broken_pool(pool):
+    """工作进程异常退出或初始化超时：停用该进程池，之后回退到本进程内识别"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.close()
+
+def _recognize_cached(images: List[np.ndarray], engine: str, recognize) -> List[Any]:
+    """按缓存查找各帧，未命中的帧合为一次 recognize 调用；结果为 None（超时）的帧返回空且不写缓存"""
+    cache = _cache
+    keys = [cache_key(img, engine) for img in images]
+    out: List[Any] = [cache.get(k) for k in keys]
+    todo = [i for i, r in enumerate(out) if r is None]
+    if todo:
+        raws = recognize([images[i] for i in todo])
+        for i, raw in zip(todo, raws):
+            out[i] = [] if raw is None else cache.put(keys[i], raw)
+    return out
+
+def ocr_many(images: List[np.ndarray]) -> List[Any]:
+    """
+    识别多帧（多个区域/守护条件），缓存未命中的帧合为一次请求：
+    进程池启动时分发给各工作进程并行识别，否则在本进程内批量识别（见 _run_ocr_batch）。
     """
-    img = grab(region)
-    results = ocr(img)
+    if not images:
+        return []
+    pool = _pool
+    if pool is not None:
+        try:
+            engine = pool.engine_id()
+        except (FutureTimeout, BrokenProcessPool):
+            # 工作进程初始化卡住或失败：停用进程池
+            _drop_broken_pool(pool)
+        else:
+            try:
+                return _recognize_cached(images, engine, pool.recognize_many)
+            except BrokenProcessPool:
+                _drop_broken_pool(pool)
+    return _recognize_cached(images, engine_id(), _run_ocr_batch)
+
+def ocr(image: np.ndarray):
+    return ocr_many([image])[0]
+
+def ocr_cache_stats() -> Dict[str, Any]:
+    """识别结果缓存的命中（内存/磁盘）与未命中计数"""
+    return _cache.stats()
+
+def clear_ocr_cache(disk: bool = False):
+    _cache.clear(disk)
+
+def _best_match(
+    results,
+    keywords: List[str],
+    region: Optional[Tuple[int, int, int, int]],
+    min_conf: float,
+    prefer_area: str,
+    negative: Optional[List[str]],
+) -> Optional[Dict[str, Any]]:
+    """在一帧的识别结果中挑出最符合关键词的文字（中心换算为屏幕坐标）"""
     negative = negative or ["上一", "上一个", "Prev", "Previous"]
 
     best = None
@@ -104,4 +320,48 @@ def find_keywords(
         l, t, _, _ = region
         best["center"] = (best["center"][0] + l, best["center"][1] + t)
 
-    return best
\ No newline at end of file
+    return best
+
+def locate_keywords(
+    keywords: List[str],
+    region: Optional[Tuple[int, int, int, int]] = None,
+    min_conf: float = 0.5,
+    prefer_area: str = "bottom-right",
+    negative: Optional[List[str]] = None,
+    frame: Optional[np.ndarray] = None,
+) -> Tuple[Optional[Dict[str, Any]], np.ndarray]:
+    """
+    在一帧画面中查找关键词。frame 为已截取的区域图像（BGR）时直接使用，否则截屏一次。
+    返回: (命中, 所用的帧)；命中为 {'center': (x,y) 屏幕坐标, 'text': str, 'conf': float, 'bbox': list} 或 None
+    """
+    img = grab(region) if frame is None else frame
+    return _best_match(ocr(img), keywords, region, min_conf, prefer_area, negative), img
+
+def locate_keywords_many(
+    queries: List[Tuple[List[str], Optional[Tuple[int, int, int, int]], str]],
+    min_conf: float = 0.5,
+    negative: Optional[List[str]] = None,
+) -> List[Tuple[Optional[Dict[str, Any]], np.ndarray]]:
+    """
+    多个区域各查找一组关键词（多个守护条件同时判断）：各区域分别截图，识别合为一次请求（见 ocr_many）。
+    queries: [(keywords, region, prefer_area), ...]；返回与 locate_keywords 相同形状的结果列表
+    """
+    imgs = [grab(region) for _, region, _ in queries]
+    results = ocr_many(imgs)
+    return [
+        (_best_match(res, keywords, region, min_conf, prefer_area, negative), img)
+        for (keywords, region, prefer_area), img, res in zip(queries, imgs, results)
+    ]
+
+def find_keywords(
+    keywords: List[str],
+    region: Optional[Tuple[int, int, int, int]] = None,
+    min_conf: float = 0.5,
+    prefer_area: str = "bottom-right",
+    negative: Optional[List[str]] = None,
+    frame: Optional[np.ndarray] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    返回: {'center': (x,y) 屏幕坐标, 'text': str, 'conf': float, 'bbox': list}
+    """
+    return locate_keywords(keywords, region, min_conf, prefer_area, negative, frame)[0]
\ No newline at end of file
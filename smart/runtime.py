@@ -1,12 +1,37 @@
 from typing import Any, Dict, List
 from .actions import SmartActions
+from .screen import (
+    DEFAULT_MOVE_DURATION, DEFAULT_SETTLE, InputInjector,
+    release_capture, set_input_injector, start_frame_grabber, stop_frame_grabber,
+)
 
 class SmartExecutor:
     """
     解释并执行 smart_* 事件；支持 IF 守护条件判断
+    frame_fps > 0 时在执行器存续期间运行后台截屏线程，截图从其最新帧读取
+    mouse/keyboard 为回放会话的 pynput 控制器，智能动作的点击/滚动/按键与回放共用；
+    move_duration/settle 为点击前的鼠标移动耗时与到位后的停顿（秒）
     """
-    def __init__(self):
+    def __init__(self, frame_fps: float = 0.0, mouse=None, keyboard=None,
+                 move_duration: float = DEFAULT_MOVE_DURATION, settle: float = DEFAULT_SETTLE):
         self.act = SmartActions()
+        self._grabber = start_frame_grabber(frame_fps) if frame_fps > 0 else None
+        self.injector = InputInjector(mouse, keyboard, move_duration, settle)
+        self._previous_injector = set_input_injector(self.injector)
+
+    def close(self):
+        """停止后台截屏线程、恢复之前的输入注入器并释放当前线程的截屏实例（由回放会话关闭时调用）"""
+        if self._grabber is not None:
+            self._grabber = None
+            stop_frame_grabber()
+        if self.injector is not None:
+            self.injector = None
+            set_input_injector(self._previous_injector)
+        release_capture()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """各智能动作的命中位置记忆统计（执行器在会话内复用，跨步骤与循环累计）"""
+        return self.act.memory_stats()
 
     def handle(self, event: List[Any]) -> bool:
         typ = event[0]
@@ -42,6 +67,12 @@ class SmartExecutor:
                 region=payload.get("region"),
                 threshold=float(payload.get("threshold", 0.84)),
             )
+        elif typ == "smart_click_any_template":
+            return self.act.click_any_template(
+                payload.get("template_paths", []),
+                region=payload.get("region"),
+                threshold=float(payload.get("threshold", 0.84)),
+            )
         elif typ == "smart_mute":
             self.act.ensure_muted(payload.get("strategy", "press_m"))
             return True
@@ -61,4 +92,16 @@ class SmartExecutor:
             region=region,
             prefer_area=prefer_area,
             require_green=require_green
-        )
\ No newline at end of file
+        )
+
+    # 多个守护条件一次判断（识别合为一次请求）
+    def conditions_met(self, payloads: List[Dict]) -> List[bool]:
+        return self.act.texts_present([
+            {
+                "keywords": p.get("keywords", []),
+                "region": p.get("region"),
+                "prefer_area": p.get("prefer_area", "bottom-right"),
+                "require_green": bool(p.get("require_green", False)),
+            }
+            for p in payloads
+        ])
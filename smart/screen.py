@@ -1,19 +1,147 @@
+import sys
+import threading
 import time
-from typing import Optional, Tuple
+from collections import deque
+from typing import Any, Deque, Optional, Tuple
 import numpy as np
 import mss
-import pyautogui
+from pynput.keyboard import Key, Controller as KeyboardController
+from pynput.mouse import Button, Controller as MouseController
 
 Region = Tuple[int, int, int, int]  # left, top, width, height
 
-def grab(region: Optional[Region] = None) -> np.ndarray:
-    with mss.mss() as sct:
-        if region:
-            l, t, w, h = region
-            monitor = {"left": l, "top": t, "width": w, "height": h}
-        else:
-            monitor = sct.monitors[1]
-        img = np.asarray(sct.grab(monitor))
+# mss 实例不能跨线程共享：每个线程持有一个，复用而不是每次截图重新创建
+_local = threading.local()
+
+def _sct():
+    sct = getattr(_local, "sct", None)
+    if sct is None:
+        sct = _local.sct = mss.mss()
+    return sct
+
+def release_capture():
+    """释放当前线程持有的 mss 实例"""
+    sct = getattr(_local, "sct", None)
+    if sct is not None:
+        _local.sct = None
+        sct.close()
+
+
+class FrameGrabber:
+    """
+    后台截屏线程：按 fps 持续截取整个主屏，环形缓冲保留最近 buffer_size 帧。
+    启用后 grab() 直接从最新帧中裁剪区域，OCR 轮询、模板匹配、IF 守护判断不再各自截屏。
+    """
+
+    def __init__(self, fps: float = 10.0, buffer_size: int = 3, monitor_index: int = 1):
+        self.fps = max(float(fps), 0.1)
+        self.monitor_index = monitor_index
+        # 帧的最大可用年龄：超过则视为过期，grab() 改为直接截屏
+        self.max_age = 2.0 / self.fps
+        self.origin = (0, 0)
+        self.frames: Deque[Tuple[float, np.ndarray]] = deque(maxlen=max(int(buffer_size), 1))
+        self.captured = 0
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        period = 1.0 / self.fps
+        with mss.mss() as sct:
+            monitor = sct.monitors[self.monitor_index]
+            self.origin = (monitor["left"], monitor["top"])
+            next_at = time.perf_counter()
+            while not self._stop.is_set():
+                try:
+                    img = np.asarray(sct.grab(monitor))[:, :, :3]
+                except Exception:
+                    img = None
+                if img is not None:
+                    self.frames.append((time.perf_counter(), img))
+                    self.captured += 1
+                    self._ready.set()
+                next_at += period
+                delay = next_at - time.perf_counter()
+                if delay < 0:
+                    # 截屏比帧间隔慢：不追帧，从现在起重新计时
+                    next_at, delay = time.perf_counter(), 0.0
+                self._stop.wait(delay)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.frames.clear()
+
+    def latest(self, max_age: Optional[float] = None, wait: float = 0.0) -> Optional[np.ndarray]:
+        """最新一帧（BGR）；没有帧或帧过期时返回 None。wait > 0 时最多等待首帧到达"""
+        if wait > 0:
+            self._ready.wait(wait)
+        try:
+            t, img = self.frames[-1]
+        except IndexError:
+            return None
+        if time.perf_counter() - t > (self.max_age if max_age is None else max_age):
+            return None
+        return img
+
+    def crop(self, region: Optional[Region] = None, max_age: Optional[float] = None) -> Optional[np.ndarray]:
+        """从最新帧裁剪屏幕区域；区域超出主屏或帧不可用时返回 None"""
+        img = self.latest(max_age)
+        if img is None or not region:
+            return img
+        l, t, w, h = region
+        x, y = l - self.origin[0], t - self.origin[1]
+        if x < 0 or y < 0 or x + w > img.shape[1] or y + h > img.shape[0]:
+            return None
+        return img[y:y + h, x:x + w]
+
+
+_grabber: Optional[FrameGrabber] = None
+_grabber_users = 0
+_grabber_lock = threading.Lock()
+
+def start_frame_grabber(fps: float = 10.0, buffer_size: int = 3) -> FrameGrabber:
+    """启动（或复用已在运行的）后台截屏线程；与 stop_frame_grabber 成对调用"""
+    global _grabber, _grabber_users
+    with _grabber_lock:
+        if _grabber is None:
+            _grabber = FrameGrabber(fps, buffer_size)
+            _grabber.start()
+        _grabber_users += 1
+        return _grabber
+
+def stop_frame_grabber():
+    global _grabber, _grabber_users
+    with _grabber_lock:
+        if _grabber is None:
+            return
+        _grabber_users -= 1
+        if _grabber_users > 0:
+            return
+        grabber, _grabber, _grabber_users = _grabber, None, 0
+    grabber.stop()
+
+def grab(region: Optional[Region] = None, max_age: Optional[float] = None) -> np.ndarray:
+    """
+    截取屏幕区域（BGR）。后台截屏线程运行时优先使用其最新帧（不超过 max_age 秒），
+    否则用当前线程的 mss 实例直接截屏。
+    """
+    grabber = _grabber
+    if grabber is not None:
+        img = grabber.crop(region, max_age)
+        if img is not None:
+            return img
+    sct = _sct()
+    if region:
+        l, t, w, h = region
+        monitor = {"left": l, "top": t, "width": w, "height": h}
+    else:
+        monitor = sct.monitors[1]
+    img = np.asarray(sct.grab(monitor))
     return img[:, :, :3]  # BGRA -> BGR
 
 def to_screen(point: Tuple[int, int], region: Optional[Region]) -> Tuple[int, int]:
@@ -22,24 +150,105 @@ def to_screen(point: Tuple[int, int], region: Optional[Region]) -> Tuple[int, in
     l, t, _, _ = region
     return (l + point[0], t + point[1])
 
-def move_click(x: int, y: int, button: str = "left", move_duration: float = 0.08):
-    pyautogui.moveTo(x, y, duration=move_duration)
-    if button == "left":
-        pyautogui.click()
-    elif button == "right":
-        pyautogui.click(button="right")
-    elif button == "middle":
-        pyautogui.click(button="middle")
-    else:
-        pyautogui.click()
+# —— 输入注入 ——
+# 直接使用 pynput 控制器：没有 pyautogui 的全局 PAUSE（每次调用后 0.1 秒）和补间移动，
+# 移动与停顿时间由 InputInjector 显式给出
+DEFAULT_MOVE_DURATION = 0.0   # 鼠标移动耗时；0 为直接定位
+DEFAULT_SETTLE = 0.015        # 移动到位后、按下前的停顿，让目标控件先收到悬停
+_MOVE_STEP = 0.01             # 补间移动时每步的间隔
+_WHEEL_DELTA = 120            # Windows 滚轮一格的单位量
+
+# 与 pyautogui 键名兼容的别名
+_KEY_ALIASES = {
+    "return": "enter", "escape": "esc", "del": "delete",
+    "pgdn": "page_down", "pagedown": "page_down", "pgup": "page_up", "pageup": "page_up",
+    "win": "cmd", "winleft": "cmd", "command": "cmd", "ctrlleft": "ctrl_l", "ctrlright": "ctrl_r",
+    "shiftleft": "shift_l", "shiftright": "shift_r", "altleft": "alt_l", "altright": "alt_r",
+}
+
+def _resolve_key(name: str) -> Any:
+    if len(name) == 1:
+        return name
+    name = name.lower()
+    try:
+        return getattr(Key, _KEY_ALIASES.get(name, name))
+    except AttributeError:
+        return name
+
+class InputInjector:
+    """
+    智能动作的键鼠注入。mouse/keyboard 可传入回放会话的控制器（与录制回放共用），否则自行创建。
+    move_duration > 0 时按 _MOVE_STEP 间隔线性移动到目标，settle 为移动后、按下前的停顿。
+    """
+
+    def __init__(self, mouse=None, keyboard=None,
+                 move_duration: float = DEFAULT_MOVE_DURATION, settle: float = DEFAULT_SETTLE):
+        self.mouse = mouse if mouse is not None else MouseController()
+        self.keyboard = keyboard if keyboard is not None else KeyboardController()
+        self.move_duration = max(float(move_duration), 0.0)
+        self.settle = max(float(settle), 0.0)
+
+    def move(self, x: int, y: int, duration: Optional[float] = None):
+        duration = self.move_duration if duration is None else duration
+        steps = int(duration / _MOVE_STEP)
+        if steps > 1:
+            x0, y0 = self.mouse.position
+            for k in range(1, steps):
+                f = k / steps
+                self.mouse.position = (int(x0 + (x - x0) * f), int(y0 + (y - y0) * f))
+                time.sleep(_MOVE_STEP)
+        self.mouse.position = (int(x), int(y))
+
+    def click(self, x: int, y: int, button: str = "left", move_duration: Optional[float] = None):
+        self.move(x, y, move_duration)
+        if self.settle > 0:
+            time.sleep(self.settle)
+        self.mouse.click(getattr(Button, button, Button.left))
+
+    def scroll(self, amount: int):
+        """amount 沿用 pyautogui 的约定：正=上，负=下；Windows 上以滚轮单位计（120 为一格）"""
+        if sys.platform == "win32":
+            notches = int(round(amount / _WHEEL_DELTA))
+            if notches == 0 and amount:
+                notches = 1 if amount > 0 else -1
+        else:
+            notches = int(amount)
+        if notches:
+            self.mouse.scroll(0, notches)
+
+    def press(self, key: str):
+        key = _resolve_key(key)
+        self.keyboard.press(key)
+        self.keyboard.release(key)
+
+
+_injector: Optional[InputInjector] = None
+_injector_lock = threading.Lock()
+
+def input_injector() -> InputInjector:
+    """当前使用的注入器（未设置时首次调用创建默认的）"""
+    global _injector
+    with _injector_lock:
+        if _injector is None:
+            _injector = InputInjector()
+        return _injector
+
+def set_input_injector(injector: Optional[InputInjector]) -> Optional[InputInjector]:
+    """替换注入器（None 恢复为默认），返回之前的注入器"""
+    global _injector
+    with _injector_lock:
+        previous, _injector = _injector, injector
+        return previous
+
+def move_click(x: int, y: int, button: str = "left", move_duration: Optional[float] = None):
+    input_injector().click(x, y, button, move_duration)
 
 def scroll(amount: int):
-    # pyautogui.scroll: 正=上, 负=下
-    pyautogui.scroll(amount)
+    input_injector().scroll(amount)
 
 def key_press(key: str):
-    pyautogui.press(key)
+    input_injector().press(key)
 
 def wait(seconds: float):
     if seconds > 0:
-        time.sleep(seconds)
\ No newline at end of file
+        time.sleep(seconds)
@@ -1,22 +1,143 @@
-from typing import Optional, Tuple
+import math
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 import cv2
 import numpy as np
 from .screen import grab, to_screen, move_click
 
-def _match_multi_scale(
-    tpl_bgr: np.ndarray,
+DEFAULT_SCALES = (0.85, 0.9, 0.95, 1.0, 1.05, 1.1, 1.15)
+
+# 粗到精搜索：粗匹配的缩小比例、每个粗匹配尺度保留的候选数、粗匹配层模板的最小边长；
+# auto 模式下截图像素数达到 COARSE_MIN_PIXELS 才使用粗到精（小区域直接全分辨率搜索更快）
+COARSE_FACTOR = 0.25
+COARSE_TOP_K = 3
+COARSE_MIN_TEMPLATE = 12
+COARSE_MIN_PIXELS = 1280 * 720
+_MAXIMIZE = (cv2.TM_CCOEFF_NORMED, cv2.TM_CCORR_NORMED)
+
+class TemplateLevel:
+    """模板金字塔中的一层：某个缩放比例下的模板图（及按需生成的粗匹配缩小图）"""
+    __slots__ = ("scale", "bgr", "wh", "_coarse")
+
+    def __init__(self, scale: float, bgr: np.ndarray):
+        self.scale = scale
+        self.bgr = bgr
+        self.wh = (bgr.shape[1], bgr.shape[0])
+        self._coarse: Dict[float, np.ndarray] = {}
+
+    def coarse(self, factor: float) -> np.ndarray:
+        """按 factor 缩小后的模板（粗匹配用，缓存）"""
+        img = self._coarse.get(factor)
+        if img is None:
+            w, h = self.wh
+            img = cv2.resize(self.bgr, (max(1, int(w * factor)), max(1, int(h * factor))), interpolation=cv2.INTER_AREA)
+            self._coarse[factor] = img
+        return img
+
+def build_pyramid(tpl_bgr: np.ndarray, scales=DEFAULT_SCALES) -> List[TemplateLevel]:
+    th, tw = tpl_bgr.shape[:2]
+    levels = []
+    for s in scales:
+        rw, rh = max(1, int(tw * s)), max(1, int(th * s))
+        levels.append(TemplateLevel(s, cv2.resize(tpl_bgr, (rw, rh), interpolation=cv2.INTER_AREA)))
+    return levels
+
+class TemplateEntry:
+    __slots__ = ("path", "signature", "image", "levels")
+
+    def __init__(self, path: str, signature: Tuple[int, int], image: np.ndarray, levels: List[TemplateLevel]):
+        self.path = path
+        self.signature = signature
+        self.image = image
+        self.levels = levels
+
+class TemplateLibrary:
+    """
+    模板缓存：每个模板只读盘解码一次，并预先生成缩放金字塔。
+      - 键为 (绝对路径, 缩放比例)，条目附带 (mtime_ns, size) 签名，文件变化后自动重新载入
+      - 按最近使用淘汰，最多保留 max_entries 个模板
+    循环执行的模板点击只需付出匹配本身的开销。
+    """
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max(int(max_entries), 1)
+        self._entries: "OrderedDict[Tuple[str, tuple], TemplateEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.evictions = 0
+
+    def get(self, template_path: str, scales=DEFAULT_SCALES) -> TemplateEntry:
+        path = os.path.abspath(template_path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            raise FileNotFoundError(f"Template not found: {template_path}")
+        sig = (st.st_mtime_ns, st.st_size)
+        key = (path, tuple(scales))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.signature == sig:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            if entry is not None:
+                self.reloads += 1
+            self.misses += 1
+
+        tpl = cv2.imread(path)
+        if tpl is None:
+            raise FileNotFoundError(f"Template not found: {template_path}")
+        entry = TemplateEntry(path, sig, tpl, build_pyramid(tpl, scales))
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def invalidate(self, template_path: str):
+        path = os.path.abspath(template_path)
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == path]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "reloads": self.reloads,
+                "evictions": self.evictions,
+            }
+
+_library = TemplateLibrary()
+
+def template_library() -> TemplateLibrary:
+    """进程内共享的模板缓存"""
+    return _library
+
+def _match_exhaustive(
+    levels: List[TemplateLevel],
     haystack_bgr: np.ndarray,
     method=cv2.TM_CCOEFF_NORMED,
-    scales=(0.85, 0.9, 0.95, 1.0, 1.05, 1.1, 1.15),
 ):
     best_val, best_loc, best_wh = -1, None, None
-    th, tw = tpl_bgr.shape[:2]
-    for s in scales:
-        rw, rh = max(1, int(tw * s)), max(1, int(th * s))
-        resized = cv2.resize(tpl_bgr, (rw, rh), interpolation=cv2.INTER_AREA)
+    for level in levels:
+        rw, rh = level.wh
         if haystack_bgr.shape[0] < rh or haystack_bgr.shape[1] < rw:
             continue
-        res = cv2.matchTemplate(haystack_bgr, resized, method)
+        res = cv2.matchTemplate(haystack_bgr, level.bgr, method)
         min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(res)
         val = max_val if method in (cv2.TM_CCOEFF_NORMED, cv2.TM_CCORR_NORMED) else -min_val
         loc = max_loc if method in (cv2.TM_CCOEFF_NORMED, cv2.TM_CCORR_NORMED) else min_loc
@@ -24,20 +145,191 @@ def _match_multi_scale(
             best_val, best_loc, best_wh = val, loc, (rw, rh)
     return best_val, best_loc, best_wh
 
+def _peaks(res: np.ndarray, k: int, radius: Tuple[int, int]):
+    """相关图中最多 k 个局部最大值（每取一个即抑制其邻域），返回 [(val, (x, y)), ...]"""
+    out = []
+    rw, rh = radius
+    for _ in range(k):
+        _, max_val, _, (x, y) = cv2.minMaxLoc(res)
+        if out and max_val <= -1.0:
+            break
+        out.append((max_val, (x, y)))
+        res[max(0, y - rh):y + rh + 1, max(0, x - rw):x + rw + 1] = -1.0
+    return out
+
+def _match_coarse_to_fine(
+    levels: List[TemplateLevel],
+    haystack_bgr: np.ndarray,
+    method=cv2.TM_CCOEFF_NORMED,
+    factor: float = COARSE_FACTOR,
+    top_k: int = COARSE_TOP_K,
+):
+    """
+    粗到精搜索：先在缩小的截图上用隔一取一的尺度找出若干候选，
+    再只在候选附近的小窗口内、以相邻尺度做全分辨率匹配。
+    """
+    smallest = min(min(level.wh) for level in levels)
+    factor = max(factor, COARSE_MIN_TEMPLATE / max(smallest, 1))
+    if factor >= 0.75 or method not in _MAXIMIZE:
+        # 模板太小（缩小后无法可靠匹配）或方法不适用：退回全分辨率搜索
+        return _match_exhaustive(levels, haystack_bgr, method)
+
+    H, W = haystack_bgr.shape[:2]
+    small = cv2.resize(haystack_bgr, (max(1, int(W * factor)), max(1, int(H * factor))), interpolation=cv2.INTER_AREA)
+    coarse_idx = list(range(0, len(levels), 2))
+    if coarse_idx[-1] != len(levels) - 1:
+        coarse_idx.append(len(levels) - 1)
+
+    cands = []
+    for idx in coarse_idx:
+        tpl = levels[idx].coarse(factor)
+        th, tw = tpl.shape[:2]
+        if small.shape[0] < th or small.shape[1] < tw:
+            continue
+        res = cv2.matchTemplate(small, tpl, method)
+        for val, loc in _peaks(res, top_k, (max(tw // 2, 1), max(th // 2, 1))):
+            cands.append((val, idx, loc))
+    cands.sort(key=lambda c: c[0], reverse=True)
+
+    best_val, best_loc, best_wh = -1, None, None
+    for _, idx, (cx, cy) in cands[:top_k]:
+        x0, y0 = int(cx / factor), int(cy / factor)
+        for j in (idx - 1, idx, idx + 1):
+            if not 0 <= j < len(levels):
+                continue
+            level = levels[j]
+            rw, rh = level.wh
+            # 窗口余量：粗定位误差（约 1/factor 像素）+ 相邻尺度带来的偏移
+            margin = int(math.ceil(2 / factor)) + int(0.1 * max(rw, rh)) + 2
+            x1, y1 = max(0, x0 - margin), max(0, y0 - margin)
+            x2, y2 = min(W, x0 + rw + margin), min(H, y0 + rh + margin)
+            window = haystack_bgr[y1:y2, x1:x2]
+            if window.shape[0] < rh or window.shape[1] < rw:
+                continue
+            res = cv2.matchTemplate(window, level.bgr, method)
+            _, max_val, _, max_loc = cv2.minMaxLoc(res)
+            if max_val > best_val:
+                best_val, best_loc, best_wh = max_val, (x1 + max_loc[0], y1 + max_loc[1]), (rw, rh)
+    return best_val, best_loc, best_wh
+
+def _match_levels(
+    levels: List[TemplateLevel],
+    haystack_bgr: np.ndarray,
+    method=cv2.TM_CCOEFF_NORMED,
+    search: str = "auto",
+):
+    """search: "exhaustive" 全分辨率逐尺度搜索 / "coarse" 粗到精 / "auto" 按截图大小选择"""
+    if search == "auto":
+        search = "coarse" if haystack_bgr.shape[0] * haystack_bgr.shape[1] >= COARSE_MIN_PIXELS else "exhaustive"
+    if search == "coarse":
+        return _match_coarse_to_fine(levels, haystack_bgr, method)
+    return _match_exhaustive(levels, haystack_bgr, method)
+
+def _match_multi_scale(
+    tpl_bgr: np.ndarray,
+    haystack_bgr: np.ndarray,
+    method=cv2.TM_CCOEFF_NORMED,
+    scales=DEFAULT_SCALES,
+    search: str = "exhaustive",
+):
+    return _match_levels(build_pyramid(tpl_bgr, scales), haystack_bgr, method, search)
+
+# —— 并行匹配引擎 ——
+# cv2.matchTemplate 执行期间释放 GIL：各尺度、各模板在线程池中并行匹配同一帧
+DEFAULT_CONFIDENT = 0.97
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def _match_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=max(2, min(8, os.cpu_count() or 2)),
+                                       thread_name_prefix="template-match")
+        return _pool
+
+def match_templates(
+    template_paths: Sequence[str],
+    haystack_bgr: np.ndarray,
+    threshold: float = 0.84,
+    confident: float = DEFAULT_CONFIDENT,
+    search: str = "auto",
+    method=cv2.TM_CCOEFF_NORMED,
+) -> List[Dict[str, Any]]:
+    """
+    在同一帧上匹配多个模板（“这些按钮中的任意一个”），返回得分不低于 threshold 的命中，按得分降序：
+      [{'template': 路径, 'score': float, 'loc': (x, y), 'wh': (w, h), 'center': (cx, cy)}, ...]
+    每个模板取其最佳位置。小截图按（模板, 尺度）拆分任务，大截图按模板拆分（各自粗到精搜索）。
+    任一命中得分达到 confident 即提前结束，未开始的任务不再执行。
+    """
+    if search == "auto":
+        search = "coarse" if haystack_bgr.shape[0] * haystack_bgr.shape[1] >= COARSE_MIN_PIXELS else "exhaustive"
+    entries = [_library.get(p) for p in template_paths]
+    stop = threading.Event()
+
+    def run(k: int, levels: List[TemplateLevel]):
+        if stop.is_set():
+            return k, (-1, None, None)
+        if search == "coarse":
+            return k, _match_coarse_to_fine(levels, haystack_bgr, method)
+        return k, _match_exhaustive(levels, haystack_bgr, method)
+
+    if search == "coarse":
+        units = [(k, entry.levels) for k, entry in enumerate(entries)]
+    else:
+        units = [(k, [level]) for k, entry in enumerate(entries) for level in entry.levels]
+
+    best: Dict[int, Tuple[float, Tuple[int, int], Tuple[int, int]]] = {}
+    pool = _match_pool()
+    pending = {pool.submit(run, k, levels) for k, levels in units}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for f in done:
+            k, (val, loc, wh) = f.result()
+            if loc is None or val < threshold:
+                continue
+            if k not in best or val > best[k][0]:
+                best[k] = (val, loc, wh)
+            if val >= confident:
+                stop.set()
+        if stop.is_set():
+            for f in pending:
+                f.cancel()
+            break
+
+    hits = []
+    for k, (val, (x, y), (w, h)) in best.items():
+        hits.append({
+            "template": entries[k].path,
+            "score": float(val),
+            "loc": (x, y),
+            "wh": (w, h),
+            "center": (x + w // 2, y + h // 2),
+        })
+    hits.sort(key=lambda hit: hit["score"], reverse=True)
+    return hits
+
 def click_template(
     template_path: str,
     region: Optional[Tuple[int, int, int, int]] = None,
     threshold: float = 0.84,
+    search: str = "auto",
 ) -> bool:
-    tpl = cv2.imread(template_path)
-    if tpl is None:
-        raise FileNotFoundError(f"Template not found: {template_path}")
+    return click_any_template([template_path], region, threshold, search) is not None
+
+def click_any_template(
+    template_paths: Sequence[str],
+    region: Optional[Tuple[int, int, int, int]] = None,
+    threshold: float = 0.84,
+    search: str = "auto",
+) -> Optional[Dict[str, Any]]:
+    """截屏一次，匹配多个模板并点击得分最高的命中；返回该命中（中心为屏幕坐标），未命中返回 None"""
     screen = grab(region)
-    val, loc, wh = _match_multi_scale(tpl, screen)
-    if loc is None or wh is None or val < threshold:
-        return False
-    x, y = loc; w, h = wh
-    cx, cy = x + w // 2, y + h // 2
-    sx, sy = to_screen((cx, cy), region)
+    hits = match_templates(template_paths, screen, threshold=threshold, search=search)
+    if not hits:
+        return None
+    hit = hits[0]
+    sx, sy = to_screen(hit["center"], region)
+    hit["center"] = (sx, sy)
     move_click(sx, sy)
-    return True
\ No newline at end of file
+    return hit
@@ -0,0 +1,89 @@
+import math
+
+import pytest
+
+from compaction import MoveDecimator, compact_events
+
+
+def moves(points, t0, dt=0.01):
+    return [["mouse_move", [x, y], t0 + k * dt] for k, (x, y) in enumerate(points)]
+
+
+def drag_session():
+    """带抖动的移动、点击、拖拽（按下-移动-松开）、按键与结尾的移动"""
+    events = []
+    events += moves([(int(10 + 3 * k + 2 * math.sin(k)), int(20 + k + (k % 2))) for k in range(40)], 0.0)
+    events += moves([(130, 60), (130, 61), (131, 60)], 0.5)  # 点击前的细微抖动
+    events.append(["mouse_press", "left", [131, 60], 0.6])
+    events.append(["mouse_release", "left", [131, 60], 0.65])
+    events.append(["mouse_press", "left", [131, 60], 1.0])
+    events += moves([(131 + 4 * k, 60 + (k * k) % 7) for k in range(1, 60)], 1.01)
+    events.append(["mouse_release", "left", [367, 62], 1.7])
+    events.append(["key_press", "a", 1.8])
+    events.append(["key_release", "a", 1.85])
+    events += moves([(367 - 2 * k, 62 + k) for k in range(1, 80)], 2.0)
+    return events
+
+
+def non_moves(events):
+    return [ev for ev in events if ev[0] != "mouse_move"]
+
+
+def last_move_before_each_event(events):
+    out, last = [], None
+    for ev in events:
+        if ev[0] == "mouse_move":
+            last = ev
+        else:
+            out.append(last)
+    return out
+
+
+def final_move(events):
+    return [ev for ev in events if ev[0] == "mouse_move"][-1]
+
+
+def assert_preserved(original, compacted):
+    assert non_moves(compacted) == non_moves(original)
+    assert last_move_before_each_event(compacted) == last_move_before_each_event(original)
+    assert final_move(compacted) == final_move(original)
+
+
+@pytest.mark.parametrize("min_distance, min_interval, epsilon", [
+    (2.0, 0.0, 1.5),
+    (25.0, 0.0, 0.0),
+    (0.0, 0.2, 0.0),
+    (0.0, 0.0, 10.0),
+    (50.0, 0.5, 20.0),
+])
+def test_compaction_keeps_clicks_drags_and_final_position(min_distance, min_interval, epsilon):
+    events = drag_session()
+    store, removed = compact_events(events, min_distance, min_interval, epsilon)
+    compacted = store.to_list()
+
+    assert removed > 0
+    assert len(compacted) == len(events) - removed
+    assert_preserved(events, compacted)
+    assert [ev[-1] for ev in compacted] == sorted(ev[-1] for ev in compacted)
+
+
+def test_online_decimator_keeps_clicks_drags_and_final_position():
+    events = drag_session()
+    out = []
+    decimator = MoveDecimator(out.append, min_distance=30.0, min_interval=0.1)
+    for ev in events:
+        decimator(ev)
+    decimator.flush()
+
+    assert len(out) < len(events)
+    assert decimator.removed == len(events) - len(out)
+    assert_preserved(events, out)
+
+
+def test_straight_run_collapses_to_endpoints():
+    line = moves([(100 + 5 * k, 200 + 2 * k) for k in range(101)], 0.0)
+    events = line + [["mouse_press", "left", [600, 400], 1.5]]
+    store, removed = compact_events(events, epsilon=0.5)
+
+    assert store.to_list() == [line[0], line[-1], events[-1]]
+    assert removed == 99
@@ -0,0 +1,18 @@
+from event_store import OP_NOP, EventStore
+
+
+def test_unparseable_event_keeps_time_order():
+    events = [
+        ["mouse_move", [1, 1], 1.0],
+        {"broken": True},
+        ["mouse_move", [2, 2], 2.0],
+        "garbage",
+        ["mouse_move", [3, 3], 3.0],
+    ]
+    store = EventStore.from_events(events)
+
+    assert store.op[1] == OP_NOP and store.op[3] == OP_NOP
+    assert list(store.t) == [1.0, 1.0, 2.0, 2.0, 3.0]
+    assert store[1] == {"broken": True}
+    assert store.index_at(2.0) == 2
+    assert store.index_at(2.5) == 4
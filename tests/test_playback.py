@@ -0,0 +1,162 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("pynput.keyboard")
+
+from playback import compile_events  # noqa: E402
+from recorder import KeyMouseRecorder  # noqa: E402
+
+
+class FakeKeyboard:
+    def __init__(self):
+        self.pressed = []
+
+    def press(self, key):
+        self.pressed.append(key)
+
+    def release(self, key):
+        pass
+
+
+class FakeSmart:
+    """守护条件按关键词判断：when[关键词] 为 None 时始终满足，为键名时该键按下后才满足；不在 when 中则不满足"""
+
+    def __init__(self, keyboard, when):
+        self.keyboard = keyboard
+        self.when = when
+        self.batches = []
+
+    def conditions_met(self, payloads):
+        self.batches.append([p["keywords"][0] for p in payloads])
+        return [self._met(p["keywords"][0]) for p in payloads]
+
+    def _met(self, keyword):
+        if keyword not in self.when:
+            return False
+        trigger = self.when[keyword]
+        return trigger is None or trigger in self.keyboard.pressed
+
+    def handle(self, event):
+        return True
+
+    def stats(self):
+        return {}
+
+
+def if_guard(keyword, t):
+    return ["smart_if_guard_ocr", {"keywords": [keyword], "interval": 0.0}, t]
+
+
+def end_guard(t):
+    return ["smart_end_guard", {}, t]
+
+
+def press(key, t):
+    return ["key_press", key, t]
+
+
+def play(events, when=None):
+    recorder = KeyMouseRecorder()
+    keyboard = FakeKeyboard()
+    smart = FakeSmart(keyboard, when or {})
+    session = SimpleNamespace(keyboard=keyboard, mouse=SimpleNamespace(position=(0, 0)), smart=smart)
+    recorder._play_plan(compile_events(events), 1000.0, session)
+    return keyboard.pressed, smart
+
+
+def test_unmatched_end_guard_is_reported_and_ignored():
+    events = [press("a", 0.0), end_guard(0.1), press("b", 0.2)]
+    plan = compile_events(events)
+    assert plan.errors == ["第 2 个事件: END-IF 没有对应的 IF"]
+    assert plan.if_jumps == {}
+
+    pressed, _ = play(events)
+    assert pressed == ["a", "b"]
+
+
+def test_unclosed_guard_is_reported_and_skipped():
+    events = [press("a", 0.0), if_guard("X", 0.1), press("b", 0.2), press("c", 0.3)]
+    plan = compile_events(events)
+    assert plan.errors == ["第 2 个事件: IF 缺少对应的 END-IF，回放时将忽略该条件"]
+    assert 1 not in plan.if_jumps
+
+    # 条件一开始就满足，但未配对的守护不生效，不会跳到错误位置
+    pressed, smart = play(events, when={"X": None})
+    assert pressed == ["a", "b", "c"]
+    assert smart.batches == []
+
+
+def test_unclosed_outer_guard_keeps_inner_pairing():
+    # END-IF 与最近的 IF 配对：缺少 END-IF 的是外层守护，只有它被忽略
+    events = [
+        press("a", 0.0),
+        if_guard("OUT", 0.1),     # 1
+        press("b", 0.2),
+        if_guard("IN", 0.3),      # 3
+        press("c", 0.4),
+        end_guard(0.5),           # 5
+        press("d", 0.6),
+    ]
+    plan = compile_events(events)
+    assert plan.errors == ["第 2 个事件: IF 缺少对应的 END-IF，回放时将忽略该条件"]
+    assert plan.if_jumps == {3: 6}
+
+    pressed, _ = play(events, when={"OUT": None})
+    assert pressed == ["a", "b", "c", "d"]
+    pressed, _ = play(events, when={"OUT": None, "IN": None})
+    assert pressed == ["a", "b", "d"]
+
+
+NESTED = [
+    press("a", 0.0),
+    if_guard("OUT", 0.1),     # 1
+    press("b", 0.2),
+    if_guard("IN", 0.3),      # 3
+    press("c", 0.4),
+    end_guard(0.5),           # 5
+    press("d", 0.6),
+    end_guard(0.7),           # 7
+    press("e", 0.8),
+]
+
+
+def test_nested_guards_jump_table():
+    plan = compile_events(NESTED)
+    assert plan.errors == []
+    assert plan.if_jumps == {1: 8, 3: 6}
+    assert plan.if_depth == {1: 1, 3: 2}
+
+
+def test_inner_guard_skips_to_its_end():
+    pressed, _ = play(NESTED, when={"IN": None})
+    assert pressed == ["a", "b", "d", "e"]
+
+
+def test_outer_guard_stays_active_after_inner_end():
+    # 外层条件在内层区间结束后才满足：仍应跳到外层 END-IF 之后
+    pressed, smart = play(NESTED, when={"OUT": "c"})
+    assert pressed == ["a", "b", "c", "e"]
+    # 嵌套的两个守护在同一次批量判断中
+    assert ["OUT", "IN"] in smart.batches
+
+
+def test_guard_around_while_exits_loop_and_jumps():
+    events = [
+        if_guard("OUT", 0.0),
+        ["smart_while_ocr", {
+            "keywords": ["NEVER"], "interval": 0.0, "max_loops": 50, "max_duration": 5.0,
+            "children": [press("x", 0.0)],
+        }, 0.1],
+        press("y", 0.2),
+        end_guard(0.3),
+        press("z", 0.4),
+    ]
+    plan = compile_events(events)
+    assert plan.errors == []
+    assert plan.if_jumps == {0: 4}
+
+    pressed, smart = play(events, when={"OUT": "x"})
+    assert pressed == ["x", "z"]
+    # WHILE 条件与外层守护合为一次判断
+    assert ["OUT", "NEVER"] in smart.batches
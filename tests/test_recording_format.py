@@ -0,0 +1,185 @@
+import json
+import math
+
+import pytest
+
+from event_store import EventStore, MappedEventStore
+from recording_format import (
+    is_binary_recording, iter_json_batches, map_recording, read_recording, write_recording,
+)
+
+
+def sample_events():
+    events = []
+    t = 0.0
+    for i in range(500):
+        t += 0.0137
+        events.append(["mouse_move", [100 + i * 3, 900 - i * 2], t])
+    events += [
+        ["mouse_press", "left", [1600, -20], t + 0.1],
+        ["mouse_release", "left", [1600, -20], t + 0.2],
+        ["mouse_scroll", [0, -3], [800, 600], t + 0.3],
+        ["key_press", "a", t + 0.4],
+        ["key_release", "a", t + 0.5],
+        ["key_press", "shift", t + 0.6],
+        ["smart_click_ocr", {"keywords": ["下一步", "Next"], "region": [0, 0, 640, 480]}, t + 0.7],
+        ["smart_if_guard_ocr", {"keywords": ["完成"]}, t + 0.8],
+        ["smart_end_guard", {}, t + 0.9],
+        ["unknown_event", 1, 2, t + 1.0],
+        ["key_release", "shift", t + 1.1],
+    ]
+    return events
+
+
+def assert_same(store, events):
+    # 压缩格式的时间戳以整数纳秒保存，只要求纳秒精度
+    assert len(store) == len(events)
+    for got, want in zip(store, events):
+        assert got[:-1] == want[:-1]
+        assert got[-1] == pytest.approx(want[-1], abs=1e-9)
+
+
+@pytest.mark.parametrize("compression", ["none", "zlib", "lzma"])
+def test_round_trip(tmp_path, compression):
+    events = sample_events()
+    path = str(tmp_path / f"rec_{compression}.mrec")
+    write_recording(path, EventStore.from_events(events), compression)
+
+    assert is_binary_recording(path)
+    assert_same(read_recording(path), events)
+
+
+def test_delta_encoding_round_trip(tmp_path):
+    # 压缩模式对时间戳与坐标做差分编码：坐标还原后完全相同，时间戳误差不超过 1 纳秒
+    events = [["mouse_move", [i * 7 - 5000, (i * i) % 3000], 1e5 + i * math.pi / 100] for i in range(2000)]
+    store = EventStore.from_events(events)
+    path = str(tmp_path / "delta.mrec")
+    write_recording(path, store, "zlib")
+
+    loaded = read_recording(path)
+    assert list(loaded.t) == pytest.approx(list(store.t), rel=0, abs=1e-9)
+    assert list(loaded.x) == list(store.x)
+    assert list(loaded.y) == list(store.y)
+
+
+def test_mmap_round_trip(tmp_path):
+    events = sample_events()
+    path = str(tmp_path / "mapped.mrec")
+    write_recording(path, EventStore.from_events(events), "none")
+
+    mapped = map_recording(path)
+    assert isinstance(mapped, MappedEventStore)
+    assert_same(mapped, events)
+    assert mapped.index_at(events[10][-1]) == 10
+    with pytest.raises(TypeError):
+        mapped.append(["key_press", "b", 99.0])
+
+    materialized = mapped.materialize()
+    materialized.append(["key_press", "b", 99.0])
+    assert_same(materialized, events + [["key_press", "b", 99.0]])
+
+
+@pytest.mark.parametrize("compression", ["zlib", "lzma"])
+def test_mmap_declines_compressed(tmp_path, compression):
+    path = str(tmp_path / "packed.mrec")
+    write_recording(path, EventStore.from_events(sample_events()), compression)
+    assert map_recording(path) is None
+
+
+# —— JSON 流式解析 ——
+def write_json(path, events, indent=None, lead="", trail=""):
+    with open(path, "w") as f:
+        f.write(lead + json.dumps(events, indent=indent) + trail)
+    return str(path)
+
+
+def stream(path, **kwargs):
+    out = []
+    for batch in iter_json_batches(path, **kwargs):
+        assert batch
+        out.extend(batch)
+    return out
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64])
+def test_stream_tiny_chunks_split_tokens_and_strings(tmp_path, chunk_size):
+    # 数字、转义字符串、中文与嵌套对象都会在块边界处被切开
+    events = sample_events() + [
+        ["smart_click_ocr", {"keywords": ["a\"b\\c", "下一步 >"], "timeout": 12.5e-1}, 123456.789],
+        ["mouse_move", [-7, 1234567], 1e-07],
+    ]
+    path = write_json(tmp_path / "rec.json", events, indent=1)
+    assert stream(path, batch_size=3, chunk_size=chunk_size) == events
+
+
+@pytest.mark.parametrize("lead, trail", [("  \n\t", ""), ("", "\n\n  "), ("\r\n" * 5, " \t\r\n")])
+def test_stream_leading_and_trailing_whitespace(tmp_path, lead, trail):
+    events = sample_events()[:20]
+    path = write_json(tmp_path / "ws.json", events, lead=lead, trail=trail)
+    assert stream(path, chunk_size=4) == events
+
+
+def test_stream_empty_array(tmp_path):
+    path = write_json(tmp_path / "empty.json", [], lead=" ", trail=" ")
+    assert stream(path, chunk_size=1) == []
+
+
+@pytest.mark.parametrize("cut", [1, 2, 5, 20])
+def test_stream_truncated_file_raises(tmp_path, cut):
+    text = json.dumps(sample_events()[:5] + [["mouse_move", [1, 2], 3.25]])
+    path = tmp_path / "cut.json"
+    path.write_text(text[:-cut])
+    with pytest.raises(ValueError):
+        stream(str(path), batch_size=2, chunk_size=3)
+
+
+def test_stream_not_an_array_raises(tmp_path):
+    path = tmp_path / "obj.json"
+    path.write_text('  {"events": []}')
+    with pytest.raises(ValueError):
+        stream(str(path))
+
+
+GUARDED = [
+    ["key_press", "a", 0.0],
+    ["smart_if_guard_ocr", {"keywords": ["OUT"]}, 0.1],
+    ["key_press", "b", 0.2],
+    ["smart_if_guard_ocr", {"keywords": ["IN"]}, 0.3],
+    ["key_press", "c", 0.4],
+    ["smart_end_guard", {}, 0.5],
+    ["key_press", "d", 0.6],
+    ["key_press", "e", 0.7],
+    ["smart_end_guard", {}, 0.8],
+    ["key_press", "f", 0.9],
+]
+
+
+def test_guard_pairing_across_batches_matches_one_shot_compile(tmp_path):
+    pytest.importorskip("pynput.keyboard")
+    from playback import PlanCompiler, StreamingLoader, compile_events
+
+    expected = compile_events(GUARDED)
+    assert expected.errors == []
+
+    # 外层 IF 在第一批，END-IF 在最后一批：之前的批次中尚无跳转
+    store = EventStore()
+    compiler = PlanCompiler(store)
+    store.extend(GUARDED[:3])
+    assert compiler.update().if_jumps == {}
+    store.extend(GUARDED[3:7])
+    assert compiler.update().if_jumps == {3: 6}
+    store.extend(GUARDED[7:])
+    plan = compiler.finish()
+    assert plan.if_jumps == expected.if_jumps == {1: 9, 3: 6}
+    assert plan.if_depth == expected.if_depth
+    assert plan.errors == []
+
+    # 经文件流式解析 + 后台载入，结果与一次性编译相同
+    path = write_json(tmp_path / "guards.json", GUARDED)
+    loader = StreamingLoader(iter_json_batches(path, batch_size=2, chunk_size=5))
+    loader.drain()
+    assert loader.error is None
+    assert loader.plan.if_jumps == expected.if_jumps
+    assert loader.plan.if_depth == expected.if_depth
+    assert loader.plan.errors == expected.errors
+    assert sorted(loader.plan.args) == sorted(expected.args)